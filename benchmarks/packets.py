@@ -0,0 +1,81 @@
+# measure the memory of the packets a flow sends with tracemalloc,
+# keeping every packet alive with a Tracer, and time the flow
+# usage: python benchmarks/packets.py [--library ./library]
+import argparse
+import os
+import time
+import tracemalloc
+
+from flatland.lang.packet import Packet
+from flatland.lang.primitives import Flow
+from flatland.lang.primitives import standard_env
+from flatland.lang.run import exec_flow
+from flatland.lang.run import parse_flow
+from flatland.lang.trace import Tracer
+from flatland.library import set_internal_dir
+from flatland.utils.context import RunContext
+from flatland.utils.raster import NumpyTurtle
+
+# only the allocations of the interpreter are counted
+FILTERS = [
+    tracemalloc.Filter(True, "*primitives.py"),
+    tracemalloc.Filter(True, "*packet.py"),
+]
+
+
+def loaded_flow(library, name):
+    "The flow of type name that the program runs, and its RunContext."
+    context = RunContext(turtle=NumpyTurtle(), backend="numpy")
+    env = standard_env(context)
+    filename = os.path.join(library, f"{name}.fbp")
+    with open(filename) as f:
+        expr = parse_flow(f.read(), filename)
+    exec_flow(expr, filename, env)
+    context.run = True
+    flows = (v for v in env.values() if isinstance(v, Flow))
+    flow = next(f for f in flows if f.flowtype == name)
+    return flow, context
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="measure the memory of the packets sent by a flow"
+    )
+    parser.add_argument("-l", "--library", default="./library")
+    parser.add_argument("-p", "--program", default="wheel")
+    parser.add_argument("-n", "--number", type=int, default=50)
+    d = parser.parse_args()
+    library = os.path.abspath(d.library)
+    set_internal_dir(library)
+    flow, context = loaded_flow(library, d.program)
+
+    kept = []
+    context.tracer = Tracer(sink=lambda flow, fnode, tnode, data: kept.append(data))
+    flow(Packet((50, 50), 0))  # warm up
+    kept.clear()
+    context.turtle.clear()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot().filter_traces(FILTERS)
+    flow(Packet((50, 50), 0))
+    after = tracemalloc.take_snapshot().filter_traces(FILTERS)
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    size = sum(s.size_diff for s in stats)
+    blocks = sum(s.count_diff for s in stats)
+    print(
+        f"{len(kept)} packets kept: {size / 1024:.1f} KiB in {blocks} blocks,"
+        f" {size / len(kept):.0f} B/packet"
+    )
+
+    context.tracer = None
+    context.turtle.clear()
+    start = time.perf_counter()
+    for _ in range(d.number):
+        flow(Packet((50, 50), 0))
+        context.turtle.clear()
+    elapsed = (time.perf_counter() - start) / d.number * 1000
+    print(f"{d.program} flow: {elapsed:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# time the Lisp parser on synthetic programs from 1 KB to 10 MB,
+# against the list.pop(0) reader it replaced, up to --old-max bytes
+# usage: python benchmarks/parse.py
+import argparse
+import time
+
+from flatland.lang.lisp import atom
+from flatland.lang.lisp import parse
+from flatland.lang.primitives import List
+
+SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7)
+
+
+def old_read_from_tokens(tokens):
+    # the previous reader, quadratic because of pop(0)
+    if len(tokens) == 0:
+        raise SyntaxError("unexpected EOF")
+    token = tokens.pop(0)
+    if token == "(":
+        L = List()
+        while tokens[0] != ")":
+            L.append(old_read_from_tokens(tokens))
+        tokens.pop(0)  # pop off ')'
+        return L
+    elif token == ")":
+        raise SyntaxError("unexpected )")
+    else:
+        return atom(token)
+
+
+def old_parse(program):
+    tokens = program.replace("(", " ( ").replace(")", " ) ").split()
+    return old_read_from_tokens(tokens)
+
+
+def synthetic(nbytes):
+    "A program of create-node and create-link forms, about nbytes long."
+    body = []
+    size = i = 0
+    while size < nbytes:
+        s = (
+            f"(create-node m{i} move (* {i} (sin (/ pi 180))) 0)\n"
+            f"(create-link m{i} m{i + 1})\n"
+        )
+        body.append(s)
+        size += len(s)
+        i += 1
+    return "(begin\n" + "".join(body) + ")"
+
+
+def timed(func, program):
+    start = time.perf_counter()
+    expr = func(program)
+    return expr, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="time the Lisp parser on programs from 1 KB to 10 MB"
+    )
+    parser.add_argument("--old-max", type=int, default=10 ** 5)
+    d = parser.parse_args()
+    print(f"{'size':>10}  {'pop(0) reader':>14}  {'parse':>10}")
+    for nbytes in SIZES:
+        program = synthetic(nbytes)
+        expr, t_new = timed(parse, program)
+        if nbytes <= d.old_max:
+            old_expr, t_old = timed(old_parse, program)
+            assert expr == old_expr
+            old = f"{t_old:11.1f} ms"
+        else:
+            old = f"{'not run':>14}"
+        print(f"{len(program) / 1000:>7.0f} KB  {old}  {t_new:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# time a variable lookup through Env.find against a resolved reference,
+# for an expression of a move node nested as in car -> wheel -> circle
+# usage: python benchmarks/resolve.py
+import argparse
+import timeit
+
+from flatland.lang.lisp import parse
+from flatland.lang.primitives import Env
+from flatland.lang.primitives import evalf
+from flatland.lang.primitives import standard_env
+from flatland.lang.resolver import resolve
+
+SOURCE = "(* radius (sin (/ pi 180)))"
+
+
+def node_env():
+    "The Env a move node of circle runs in, inside a wheel inside a car."
+    car = Env(outer=standard_env())
+    car.update(wsize=10, wspokes=8, wdist=50, m0=0, w0=0, m1=0)
+    wheel = Env(outer=car)
+    wheel.update(radius=10, spokes=8, circle1=0, t0=0, m1=0, loop1=0)
+    circle = Env(outer=wheel)
+    circle.update(radius=10, loop1=0, move1=0, turn1=0, __internal__=0)
+    return Env(outer=circle)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="time Env.find against resolved variable references"
+    )
+    parser.add_argument("-n", "--number", type=int, default=200000)
+    d = parser.parse_args()
+    env = node_env()
+    plain = parse(SOURCE)
+    # resolved as the argument of a create-node in the body of circle
+    flow = parse(f"(define-flow circle (radius) () ((create-node m move {SOURCE} 0)))")
+    resolve(flow)
+    resolved = flow[4][0][3]
+    assert evalf(plain, env) == evalf(resolved, env)
+    for label, expr in (("Env.find", plain), ("resolved", resolved)):
+        t_eval = timeit.timeit(lambda: evalf(expr, env), number=d.number)
+        print(f"{label:8}  evalf {t_eval / d.number * 1e6:6.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,3 +3,13 @@ __version__ = "0.0.1"
 import logging
 
 logging.getLogger("flatland").addHandler(logging.NullHandler())
+
+
+def __getattr__(name):
+    # imported on first use, so that importing flatland.metrics
+    # does not import the interpreter and the drawing backends
+    if name == "render_many":
+        from flatland.lang.run import render_many
+
+        return render_many
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1 +1,3 @@
+from .plan import SamplingPlan
 from .single import main as single_file
+from .streaming import stream
@@ -0,0 +1,71 @@
+# the randomized slots of a program, to draw the parameters of many
+# samples at once, and to run the program with given parameters
+import numpy as np
+
+from flatland.augment.streaming import generate
+from flatland.utils.randomizer import PlannedStream
+from flatland.utils.randomizer import PlanRecorder
+
+
+def column(rule, u):
+    """Map uniform [0, 1) values u to values drawn with rule, or for a choice,
+    to the indices of the choices drawn, so that any choices can be planned."""
+    tp = rule["type"]
+    if tp == "int":
+        return rule["min"] + np.floor(u * (rule["max"] - rule["min"]))
+    elif tp == "float":
+        return rule["min"] + u * (rule["max"] - rule["min"])
+    elif tp == "choice":
+        return np.floor(u * len(rule["choices"]))
+    elif tp == "bool":
+        return (u < rule["true_prob"]).astype(np.float64)
+    raise ValueError(f"cannot sample a {tp} slot")
+
+
+class SamplingPlan:
+    """The (slot, rule) pairs of the values a randomized program draws, in the
+    order it draws them. A slot is named after the node or flow parameter, or
+    the start position, it is drawn for, and a rule is the to_dict() of its
+    randomizer."""
+
+    def __init__(self, slots):
+        self.slots = list(slots)
+
+    @classmethod
+    def from_program(cls, program: str, filename="<program>.fbp"):
+        "The plan of program, found by running it once."
+        recorder = PlanRecorder()
+        next(generate(program, filename, [(recorder, None)], size=16))
+        return cls(recorder.slots)
+
+    @property
+    def labels(self):
+        return [slot for slot, _ in self.slots]
+
+    def to_dict(self):
+        return [dict(slot=slot, rule=rule) for slot, rule in self.slots]
+
+    def sample(self, k, seed=None):
+        """A (k, len(slots)) float64 matrix of parameters, one row per sample,
+        with the same distributions as the randomizers. A choice slot holds
+        the index of the choice drawn. The uniform values of all the samples
+        are drawn in one call."""
+        rng = np.random.default_rng(seed)
+        u = rng.random((k, len(self.slots)))
+        params = np.empty_like(u)
+        for i, (_, rule) in enumerate(self.slots):
+            params[:, i] = column(rule, u[:, i])
+        return params
+
+    def instantiate(self, program: str, params, filename="<program>.fbp", size=256):
+        """Yield (expr, spec, image) for every row of params, where program
+        draws the values in the row instead of random ones."""
+        streams = [PlannedStream(self.slots, row) for row in params]
+        # the values are planned, so the names are drawn from the same stream
+        samples = generate(program, filename, ((s, s) for s in streams), size)
+        for stream, sample in zip(streams, samples):
+            if stream.index != len(self.slots):
+                raise ValueError(
+                    f"{filename} drew {stream.index} of {len(self.slots)} values"
+                )
+            yield sample
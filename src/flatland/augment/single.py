@@ -1,34 +1,128 @@
 # create randomized versions of a single program,
 # provided as string input
 import json
+import logging
+import multiprocessing
 import os
+import random
 
-import flatland.utils.config as CONFIG
+from flatland.lang.primitives import clone
+from flatland.lang.primitives import standard_env
+from flatland.lang.run import load_includes
 from flatland.lang.run import main as runner
+from flatland.lang.run import parse_flow
+from flatland.utils.context import DEFAULT_CONTEXT
+from flatland.utils.misc import export_settings
+from flatland.utils.misc import import_settings
 from flatland.utils.modding import finalize
 from flatland.utils.modding import initialize
 from flatland.utils.randomizer import GENERATE_FILEID
+from flatland.utils.randomizer import names_rng
+from flatland.utils.randomizer import sample_rng
 
+logger = logging.getLogger("flatland.augment.single")
+
+# the settings a worker process copies from flatland.utils.config
+SETTINGS = ("BACKEND", "SCHEDULER", "CACHE_DIR", "CACHE_SIZE")
+
+
+def setup(program: str, filename: str, context=DEFAULT_CONTEXT):
+    """Initialize the turtle of context, parse program, and return its
+    expression and an Env with its includes, to run in context."""
+    context.randomize = True
+    context.run = True
+    context.showturtle = False
+    initialize(context)
+    context.rng = context.names = None
+    template = parse_flow(program, filename)
+    env = load_includes(program, filename, standard_env(context), template)
+    return template, env
 
-def main(program: str, filename: str, num_samples: int, outdir: str):
-    outdir = os.path.abspath(outdir)
-    CONFIG.RANDOMIZE = True
-    CONFIG.RUN = True
-    CONFIG.SHOWTURTLE = False
 
-    initialize()
+def write_sample(program, filename, template, env, outdir, save_strokes, seed, index):
+    """Run sample index of program from a clone of its parsed template
+    and a fork of env, and write its files."""
+    context = env.context
+    if seed is not None:
+        context.rng = sample_rng(seed, index)
+        context.names = names_rng(seed, index)
     basename = os.path.splitext(os.path.basename(filename))[0]
-    for i in range(num_samples):
-        newname = f"{basename}-{GENERATE_FILEID()}"
-        CONFIG.SKIPIMAGE = True
-        expr, info = runner(program, filename, env=None)
+    newname = f"{basename}-{GENERATE_FILEID(context.rng)}"
+    context.skipimage = True
+    expr, info = runner(program, filename, env=env.fork(), expr=clone(template))
+
+    newpath = os.path.join(outdir, newname)
+    with open(newpath + ".lisp", "w") as f2:
+        f2.write(str(expr))
+
+    with open(newpath + ".json", "w") as f3:
+        json.dump(info, f3, indent=4)
+
+    if save_strokes:
+        context.turtle.strokes.save(newpath + ".npy")
+
+    context.skipimage = False
+    finalize(newpath + ".lisp", context)
+    context.rng = context.names = None
+    return newpath
 
-        newpath = os.path.join(outdir, newname)
-        with open(newpath + ".lisp", "w") as f2:
-            f2.write(str(expr))
 
-        with open(newpath + ".json", "w") as f3:
-            json.dump(info, f3, indent=4)
+# what a worker process keeps between the samples it is sent
+__WORKER__ = dict()
+
+
+def init_worker(program, filename, outdir, save_strokes, seed, library, settings):
+    import_settings(library, settings)
+    template, env = setup(program, filename)
+    __WORKER__["args"] = (
+        program,
+        filename,
+        template,
+        env,
+        outdir,
+        save_strokes,
+        seed,
+    )
+
+
+def run_worker(index):
+    return write_sample(*__WORKER__["args"], index)
+
+
+def main(
+    program: str,
+    filename: str,
+    num_samples: int,
+    outdir: str,
+    save_strokes=False,
+    seed=None,
+    start=0,
+    jobs=1,
+    context=DEFAULT_CONTEXT,
+):
+    """Write num_samples randomized versions of program to outdir. With a
+    seed, sample i is drawn from sample_rng(seed, i), for i counting from
+    start, so a job can be split into shards and any sample made again.
+    With jobs > 1, the samples are split between that many processes,
+    which write the same files as a single one would for the same seed.
+    Otherwise, they are run in context."""
+    outdir = os.path.abspath(outdir)
+    indices = range(start, start + num_samples)
+    if jobs <= 1:
+        template, env = setup(program, filename, context)
+        for i in indices:
+            args = (program, filename, template, env, outdir, save_strokes, seed)
+            write_sample(*args, i)
+        return
 
-        CONFIG.SKIPIMAGE = False
-        finalize(newpath + ".lisp")
+    if seed is None:
+        # workers would otherwise share the state of the random module
+        seed = random.randrange(2 ** 32)
+        logger.info(f"using seed {seed} for {jobs} workers")
+    library, settings = export_settings(SETTINGS)
+    initargs = (program, filename, outdir, save_strokes, seed, library, settings)
+    # small chunks keep the workers busy until the end of the run
+    chunksize = max(1, min(64, num_samples // (jobs * 8)))
+    with multiprocessing.Pool(jobs, init_worker, initargs) as pool:
+        for _ in pool.imap_unordered(run_worker, indices, chunksize):
+            pass
@@ -0,0 +1,114 @@
+# create randomized versions of a single program in memory,
+# as an iterator of samples for data loaders
+import itertools
+import queue
+import random
+import threading
+
+import flatland.utils.config as CONFIG
+from flatland.lang.primitives import clone
+from flatland.lang.primitives import resolve_scope
+from flatland.lang.primitives import standard_env
+from flatland.lang.run import load_includes
+from flatland.lang.run import main as runner
+from flatland.lang.run import parse_flow
+from flatland.utils.context import RunContext
+from flatland.utils.randomizer import GENERATE_FILEID
+from flatland.utils.randomizer import names_rng
+from flatland.utils.randomizer import sample_rng
+from flatland.utils.raster import NumpyTurtle
+
+
+def generate(program, filename, streams, size):
+    """Yield (expr, spec, image) for a sample of program drawn from each
+    (rng, names) pair of streams, of its values and node names, where spec
+    is resolved with resolve_scope."""
+    context = RunContext(
+        turtle=NumpyTurtle(size=size),
+        randomize=True,
+        run=True,
+        skipimage=True,
+        backend="numpy",
+        scheduler=CONFIG.SCHEDULER,
+    )
+    template = parse_flow(program, filename)
+    env = load_includes(program, filename, standard_env(context), template)
+    for rng, names in streams:
+        # the file name flatland-augment draws first, so that sample index
+        # of a stream is the same as the one it writes for the same seed
+        GENERATE_FILEID(rng)
+        sample_env = env.fork(context.copy(rng=rng, names=names))
+        expr, spec = runner(program, filename, sample_env, expr=clone(template))
+        yield expr, resolve_scope(spec), context.turtle.render()
+        context.turtle.clear()
+
+
+# put after the last sample, when the samples are a finite iterator
+END_OF_SAMPLES = object()
+
+
+def prefetched(samples, prefetch):
+    """Iterate over samples, which are made in a background thread, at most
+    prefetch of them ahead of the consumer."""
+    pending = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def put(item):
+        # give up if the consumer stopped, instead of waiting for it forever
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker():
+        try:
+            for sample in samples:
+                if not put((sample, None)):
+                    return
+        except Exception as e:
+            put((None, e))
+        else:
+            put((END_OF_SAMPLES, None))
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            sample, error = pending.get()
+            if error is not None:
+                raise error
+            if sample is END_OF_SAMPLES:
+                return
+            yield sample
+    finally:
+        stop.set()
+
+
+def stream(
+    program: str,
+    seed=None,
+    filename="<program>.fbp",
+    start=0,
+    size=256,
+    prefetch=0,
+):
+    """An endless iterator of randomized samples of program, as (expr, spec,
+    image) tuples, where spec is the JSON spec of the flows resolved with
+    resolve_scope, which program_distance compares, and image a (size,
+    size) uint8 array. Sample i is drawn from
+    sample_rng(seed, i) and names_rng(seed, i), so it is the same one
+    flatland-augment writes, and nothing is written to disk. filename gives
+    the syntax of the program, and where its relative #includes are. With
+    prefetch > 0, that many samples are made ahead in a background thread."""
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    streams = (
+        (sample_rng(seed, i), names_rng(seed, i)) for i in itertools.count(start)
+    )
+    samples = generate(program, filename, streams, size)
+    if prefetch > 0:
+        return prefetched(samples, prefetch)
+    return samples
@@ -3,10 +3,12 @@ import json
 import logging
 import sys
 
+import flatland.utils.config as CONFIG
 from flatland.augment import single_file
 from flatland.lang.run import main as runner
 from flatland.library import set_internal_dir
 from flatland.utils.misc import check_dir
+from flatland.utils.modding import BACKENDS
 
 
 def main():
@@ -28,6 +30,25 @@ def main():
         type=int,
         help="number of files to generate",
     )
+    parser.add_argument(
+        "--seed",
+        default=None,
+        type=int,
+        help="base seed, samples with the same seed and index are identical",
+    )
+    parser.add_argument(
+        "--start",
+        default=0,
+        type=int,
+        help="index of the first sample, to generate one shard of a seeded run",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        default=1,
+        type=int,
+        help="number of worker processes generating samples",
+    )
     parser.add_argument(
         "-o",
         "--output-dir",
@@ -42,6 +63,20 @@ def main():
         type=check_dir,
         help="folder containing library of flows",
     )
+    parser.add_argument(
+        "-b",
+        "--backend",
+        default="tk",
+        choices=BACKENDS,
+        help="drawing backend, numpy does not need a display",
+    )
+    parser.add_argument(
+        "-s",
+        "--save-strokes",
+        default=False,
+        action="store_true",
+        help="also save the (x0, y0, x1, y1, penup) strokes of each sample as .npy",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -55,9 +90,19 @@ def main():
         logging.getLogger("PIL").propagate = False
 
     set_internal_dir(d.library)
+    CONFIG.BACKEND = d.backend
     program = d.file.read()
     d.file.close()
-    single_file(program, d.file.name, d.num_samples, d.output_dir)
+    single_file(
+        program,
+        d.file.name,
+        d.num_samples,
+        d.output_dir,
+        d.save_strokes,
+        seed=d.seed,
+        start=d.start,
+        jobs=d.jobs,
+    )
 
 
 if __name__ == "__main__":
@@ -2,6 +2,7 @@ import argparse
 import glob
 import json
 import logging
+import multiprocessing
 import os
 import sys
 
@@ -11,10 +12,16 @@ import pandas as pd
 
 import flatland.utils.config as CONFIG
 from flatland.lang.primitives import resolve_scope
+from flatland.lang.primitives import standard_env
 from flatland.lang.run import main as parse_and_run_flow
 from flatland.library import set_internal_dir
 from flatland.metrics import program_distance
+from flatland.metrics import ProgramGraph
+from flatland.metrics.program_dist import distance_bound
+from flatland.metrics.program_dist import distance_bounds
 from flatland.utils.misc import check_dir
+from flatland.utils.misc import export_settings
+from flatland.utils.misc import import_settings
 
 
 def check_files(folder):
@@ -33,22 +40,99 @@ def check_csv(fname):
     raise ValueError(f"{fname} is not a .csv")
 
 
-def get_data(filename):
+def get_data(filename, env=None):
     with open(filename) as f:
-        _, fdata = parse_and_run_flow(f.read(), filename, env=None)
+        _, fdata = parse_and_run_flow(f.read(), filename, env=env)
     return resolve_scope(fdata)
 
 
+# the settings a worker process copies from flatland.utils.config
+SETTINGS = ("RUN", "BACKEND", "CACHE_DIR", "CACHE_SIZE")
+
+
+def load_graphs(filenames, library, settings):
+    "The ProgramGraphs of filenames, loaded in a worker process."
+    import_settings(library, settings)
+    env = standard_env()
+    return [ProgramGraph(get_data(f, env.fork())) for f in filenames]
+
+
+def min_distances(tests, train, bounds):
+    """The minimum distance from each of tests to train, and the number of
+    exact comparisons skipped. Programs in train are visited in the order of
+    bounds, the lower bounds of their distances, until no closer one is left,
+    and a program is only compared exactly if its distance_bound is lower
+    than the closest one found so far."""
+    answer = np.zeros(len(tests), np.float32)
+    skipped = 0
+    for i, p_dash in enumerate(tests):
+        best = np.inf
+        order = np.argsort(bounds[i], kind="stable")
+        for n, j in enumerate(order):
+            if best == 0 or bounds[i, j] >= best:
+                skipped += len(order) - n
+                break
+            if distance_bound(p_dash, train[j]) >= best:
+                skipped += 1
+                continue
+            best = min(best, program_distance(p_dash, train[j]))
+        answer[i] = best
+    return answer, skipped
+
+
+# what a worker process keeps between the test programs it is sent
+__WORKER__ = dict()
+
+
+def init_worker(train):
+    __WORKER__["train"] = train
+
+
+def run_worker(task):
+    tests, bounds = task
+    return min_distances(tests, __WORKER__["train"], bounds)
+
+
+def split(items, n):
+    "items in at most n contiguous chunks of nearly equal size."
+    if len(items) == 0:
+        return []
+    size = -(-len(items) // n)
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
 def run(train_set, test_set, output_fname):
     # print(train_set, test_set)
-    final_scores = np.zeros((len(test_set), 1), np.float32)
-    with joblib.Parallel(n_jobs=-1) as parallel:
-        for i, t_dash in enumerate(test_set):
-            p_dash = get_data(t_dash)
-            scores = parallel(
-                joblib.delayed(program_distance)(p_dash, get_data(t)) for t in train_set
-            )
-            final_scores[i] = np.min(scores)
+    if len(train_set) == 0 or len(test_set) == 0:
+        raise ValueError("the training and test sets need at least one program")
+    library, settings = export_settings(SETTINGS)
+    jobs = joblib.cpu_count()
+    nchunks = 4 * jobs
+    with joblib.Parallel(n_jobs=jobs) as parallel:
+        # every program is interpreted once, and only the
+        # ProgramGraphs are sent to the comparisons
+        files = list(test_set) + list(train_set)
+        loaded = parallel(
+            joblib.delayed(load_graphs)(chunk, library, settings)
+            for chunk in split(files, nchunks)
+        )
+    graphs = [g for gs in loaded for g in gs]
+    tests, train = graphs[: len(test_set)], graphs[len(test_set) :]
+    bounds = distance_bounds(tests, train)
+    tasks = [
+        (tests[c.start : c.stop], bounds[c.start : c.stop])
+        for c in split(range(len(tests)), nchunks)
+    ]
+    if jobs <= 1:
+        results = [min_distances(tests, train, bounds)]
+    else:
+        # every worker is sent the training graphs once, when it starts,
+        # and then only the test graphs of its chunks
+        with multiprocessing.Pool(jobs, init_worker, (train,)) as pool:
+            results = pool.map(run_worker, tasks, chunksize=1)
+    final_scores = np.concatenate([r[0] for r in results])[:, None]
+    skipped = sum(r[1] for r in results)
+    print(f"skipped {skipped} of {bounds.size} exact comparisons")
     DD = np.mean(final_scores)
     score_df = pd.DataFrame(
         final_scores,
@@ -61,6 +145,7 @@ def run(train_set, test_set, output_fname):
 
 def main():
     CONFIG.RUN = False
+    CONFIG.BACKEND = "numpy"  # nothing is drawn
     parser = argparse.ArgumentParser(
         prog="flatland-ddist",
         description="find the domain distance between given sets by pairwise comparisons",
@@ -89,6 +174,12 @@ def main():
         default="./library",
         help="folder containing primitives of library",
     )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        type=str,
+        help="folder to cache parsed programs in, disabled if not given",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -102,6 +193,7 @@ def main():
         logging.getLogger("PIL").propagate = False
 
     set_internal_dir(d.library)
+    CONFIG.CACHE_DIR = d.cache_dir
     run(d.train_set, d.test_set, d.output)
 
 
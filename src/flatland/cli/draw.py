@@ -3,8 +3,11 @@ import logging
 
 import flatland.utils.config as CONFIG
 from flatland.lang.run import main as runner
+from flatland.lang.scheduler import SCHEDULERS
+from flatland.lang.trace import Tracer
 from flatland.library import set_internal_dir
 from flatland.utils.misc import check_dir
+from flatland.utils.modding import BACKENDS
 
 
 def main():
@@ -30,6 +33,19 @@ def main():
         type=check_dir,
         help="folder containing library of flows",
     )
+    parser.add_argument(
+        "-b",
+        "--backend",
+        default="tk",
+        choices=BACKENDS,
+        help="drawing backend, numpy does not need a display",
+    )
+    parser.add_argument(
+        "--scheduler",
+        default="fifo",
+        choices=list(SCHEDULERS),
+        help="order in which the information packets are processed",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -42,14 +58,20 @@ def main():
     if d.verbose:
         logging.basicConfig(level=logging.DEBUG)
         logging.getLogger("PIL").propagate = False
+        CONFIG.TRACER = Tracer()
     set_internal_dir(d.library)
     CONFIG.SHOWTURTLE = d.show
+    CONFIG.BACKEND = d.backend
     CONFIG.RANDOMIZE = d.randomize
+    CONFIG.SCHEDULER = d.scheduler
     CONFIG.RUN = True
     expr, fdata = runner(d.file.read(), d.file.name)
 
     if d.verbose and CONFIG.RANDOMIZE:
         print(expr)
+    if d.verbose:
+        print("packets:", CONFIG.TRACER.packets())
+        print("nodes:", CONFIG.TRACER.to_dict())
 
 
 if __name__ == "__main__":
@@ -47,6 +47,7 @@ def run(file1, file2):
 
 def main():
     CONFIG.RUN = False
+    CONFIG.BACKEND = "numpy"  # nothing is drawn
     parser = argparse.ArgumentParser(
         prog="flatland-scoring",
         description="find the distance between two FBP",
@@ -57,6 +58,12 @@ def main():
     )
     parser.add_argument("file1", type=str)
     parser.add_argument("file2", type=str)
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        type=str,
+        help="folder to cache parsed programs in, disabled if not given",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -69,6 +76,7 @@ def main():
         logging.basicConfig(level=logging.DEBUG)
         logging.getLogger("PIL").propagate = False
     set_internal_dir(d.library)
+    CONFIG.CACHE_DIR = d.cache_dir
     print("distance is:", run(d.file1, d.file2))
 
 
@@ -26,6 +26,7 @@ def show_gv(lib):
 
 
 def main():
+    CONFIG.BACKEND = "numpy"  # nothing is drawn
     parser = argparse.ArgumentParser(
         prog="flatland-library",
         description="script to show primitives and dependencies of library",
@@ -46,6 +47,12 @@ def main():
         action="store_true",
         help="visualize library dependencies with graphviz",
     )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        type=str,
+        help="folder to cache parsed programs in, disabled if not given",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -59,6 +66,7 @@ def main():
         logging.getLogger("PIL").propagate = False
 
     set_internal_dir(d.library)
+    CONFIG.CACHE_DIR = d.cache_dir
     a = create_library(d.library)
     print(a)
     if d.visualize:
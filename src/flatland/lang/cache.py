@@ -0,0 +1,102 @@
+# on-disk cache of parsed programs, keyed by a hash of the source,
+# so that library files are not re-parsed by every run
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+
+logger = logging.getLogger("flatland.lang.cache")
+
+# bump this when the parsers change the trees they build
+CACHE_VERSION = "1"
+
+
+class ParseCache:
+    "A directory of pickled expressions, with least-recently-used eviction."
+
+    def __init__(self, directory, max_bytes):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self.total = sum(size for _, size, _ in self.entries())
+
+    def key(self, program: str, ext: str):
+        h = hashlib.sha1()
+        h.update(f"{CACHE_VERSION}:{ext}:".encode("utf-8"))
+        h.update(program.encode("utf-8"))
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.pickle")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                expr = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass  # evicted by another process since it was read
+        return expr
+
+    def put(self, key, expr):
+        path = self.path(key)
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(expr, f, protocol=pickle.HIGHEST_PROTOCOL)
+        size = os.path.getsize(tmp)
+        os.replace(tmp, path)
+        # an existing entry is overwritten, not added
+        self.total += size - old_size
+        if self.total > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        answer = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pickle"):
+                st = entry.stat()
+                answer.append((st.st_mtime, st.st_size, entry.path))
+        return answer
+
+    def evict(self):
+        # other processes may share the directory, so rescan it
+        entries = sorted(self.entries())
+        self.total = sum(size for _, size, _ in entries)
+        while self.total > self.max_bytes and entries:
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total -= size
+            logger.info(f"evicted {path} from parse cache")
+
+    def parse(self, program: str, ext: str, parser):
+        key = self.key(program, ext)
+        expr = self.get(key)
+        if expr is None:
+            expr = parser(program)
+            self.put(key, expr)
+        return expr
+
+
+__CACHES__ = dict()
+
+
+def get_cache(directory, max_bytes):
+    directory = os.path.abspath(directory)
+    cache = __CACHES__.get(directory)
+    if cache is None:
+        cache = ParseCache(directory, max_bytes)
+        __CACHES__[directory] = cache
+    cache.max_bytes = max_bytes
+    return cache
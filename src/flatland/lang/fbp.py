@@ -1,6 +1,9 @@
 import json
 
+from flatland.lang.lisp import atom
 from flatland.lang.lisp import parse as parse_lisp
+from flatland.lang.primitives import List
+from flatland.lang.primitives import Symbol
 
 
 def rewrite_edge(edge, frandoms):
@@ -56,18 +59,19 @@ def rewrite_edge(edge, frandoms):
     return "".join(answer)
 
 
-def fbp_to_lisp(program):
-    lines = program.split("\n")
+def edge_cleaner(s):
+    fnode, tnode = s.split("->")
+    return fnode.strip(), tnode.strip()
+
 
-    def edge_cleaner(s):
-        fnode, tnode = s.split("->")
-        return fnode.strip(), tnode.strip()
+def param_cleaner(s):
+    parset, body = s.split("}")
+    parname = parset.split("{")[1]
+    return "__randomize__", (parname.strip(), body.strip())
 
-    def param_cleaner(s):
-        parset, body = s.split("}")
-        parname = parset.split("{")[1]
-        return "__randomize__", (parname.strip(), body.strip())
 
+def split_program(program):
+    lines = program.split("\n")
     edges = []
     imports = []
     rand_params = []
@@ -82,8 +86,13 @@ def fbp_to_lisp(program):
             edges.extend(rand_params)
             edges.append(edge_cleaner(line))
             rand_params.clear()
+    return imports, edges
+
+
+def fbp_to_lisp(program):
+    imports, edges = split_program(program)
     # print("edges", edges)
-    rand_params.clear()
+    rand_params = []
     expr = (
         "(begin\n"
         + "\n".join(imports)
@@ -94,6 +103,71 @@ def fbp_to_lisp(program):
     return expr
 
 
+def split_node(tnode):
+    "split name(type args...) into the name and the parsed (type args...)"
+    if "(" in tnode:
+        ind = tnode.index("(")
+        return atom(tnode[:ind].strip()), parse_lisp(tnode[ind:])
+    return atom(tnode), None
+
+
+def build_edge(edge, frandoms, scopes):  # noqa: C901
+    # same cases as rewrite_edge, but appends List expressions
+    # to the innermost open scope instead of writing Lisp text
+    fnode, tnode = edge
+    if "__randomize__" in fnode:  # randomizer parameter for upcoming flow
+        parname, body = tnode
+        frandoms.append(List([atom(parname), parse_lisp(body)]))
+    elif "(start" in fnode:  # define-flow open
+        ind = fnode.index("(")
+        fname = atom(fnode[:ind].strip())
+        fparams = parse_lisp("(" + fnode[ind + 1 :].split("start", 1)[1])
+        body = List()
+        scopes[-1].append(
+            List([Symbol("define-flow"), fname, fparams, List(frandoms), body])
+        )
+        frandoms.clear()
+        scopes.append(body)
+        tname, tprops = split_node(tnode)
+        body.append(List([Symbol("create-node"), tname, *tprops]))
+        body.append(List([Symbol("create-entry"), tname]))
+    elif "{" in fnode:  # defining the main flow
+        data = json.loads(fnode)
+        x, y = data.get("position", (64, 64))
+        theta = data.get("theta", 0)
+        tname, opts = split_node(tnode)
+        pos = List([atom(str(x)), atom(str(y))])
+        scopes[-1].append(
+            List([Symbol("run-flow"), tname, opts or List(), pos, atom(str(theta))])
+        )
+    elif "(end" in tnode:  # define-flow closed
+        scopes[-1].append(List([Symbol("create-exit"), *map(atom, fnode.split())]))
+        if len(scopes) > 1:
+            scopes.pop()
+    else:  # just an edge
+        fname, *port = fnode.split(" ")
+        if len(port) == 0:
+            port = "out"
+        else:
+            port = port[0]
+
+        tname, tprops = split_node(tnode)
+        if tprops is not None:
+            scopes[-1].append(List([Symbol("create-node"), tname, *tprops]))
+
+        if port == "out":
+            scopes[-1].append(List([Symbol("create-link"), atom(fname), tname]))
+        else:
+            link = List([Symbol("create-link"), atom(f"{fname}:{port}"), tname])
+            scopes[-1].append(link)
+
+
 def parse(program: str):
-    expr = fbp_to_lisp(program)
-    return parse_lisp(expr)
+    imports, edges = split_program(program)
+    expr = List([Symbol("begin")])
+    expr.extend(parse_lisp(x) for x in imports)
+    scopes = [expr]
+    rand_params = []
+    for edge in edges:
+        build_edge(edge, rand_params, scopes)
+    return expr
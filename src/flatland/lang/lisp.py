@@ -2,6 +2,8 @@
 # (How to Write a (Lisp) Interpreter (in Python))
 # https://norvig.com/lang.html
 # https://norvig.com/lis.py
+import re
+
 from flatland.lang.primitives import Atom
 from flatland.lang.primitives import evalf
 from flatland.lang.primitives import Exp
@@ -20,24 +22,32 @@ def atom(token: str) -> Atom:
             return Symbol(token)
 
 
-def read_from_tokens(tokens: List) -> Exp:
-    if len(tokens) == 0:
-        raise SyntaxError("unexpected EOF")
-    token = tokens.pop(0)
-    if token == "(":
-        L = List()
-        while tokens[0] != ")":
-            L.append(read_from_tokens(tokens))
-        tokens.pop(0)  # pop off ')'
-        return L
-    elif token == ")":
-        raise SyntaxError("unexpected )")
-    else:
-        return atom(token)
+def read_from_tokens(tokens: list) -> Exp:
+    # walk the tokens with a stack of open lists,
+    # so reading is linear in the number of tokens
+    stack = []
+    for token in tokens:
+        if token == "(":
+            stack.append(List())
+        elif token == ")":
+            if len(stack) == 0:
+                raise SyntaxError("unexpected )")
+            L = stack.pop()
+            if len(stack) == 0:
+                return L
+            stack[-1].append(L)
+        elif len(stack) == 0:
+            return atom(token)
+        else:
+            stack[-1].append(atom(token))
+    raise SyntaxError("unexpected EOF")
+
+
+TOKEN = re.compile(r"[()]|[^\s()]+")
 
 
 def tokenize(chars: str) -> list:
-    return chars.replace("(", " ( ").replace(")", " ) ").split()
+    return TOKEN.findall(chars)
 
 
 def parse(program: str) -> Exp:
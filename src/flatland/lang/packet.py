@@ -0,0 +1,43 @@
+# the information packets that nodes send each other; packets are never
+# modified after they are sent, so nodes can share them instead of copying
+
+
+class LoopCounters(tuple):
+    "A persistent map of (loop, counter) pairs, updates return a new map."
+
+    __slots__ = ()
+
+    def get(self, key, default=None):
+        for k, v in self:
+            if k == key:
+                return v
+        return default
+
+    def set(self, key, value):
+        return LoopCounters((*(kv for kv in self if kv[0] != key), (key, value)))
+
+    def remove(self, key):
+        return LoopCounters(kv for kv in self if kv[0] != key)
+
+
+NO_LOOPS = LoopCounters()
+
+
+class Packet:
+    "The state of the turtle, and the counters of the loops the packet is in."
+
+    __slots__ = ("position", "theta", "loops")
+
+    def __init__(self, position, theta, loops=NO_LOOPS):
+        self.position = position
+        self.theta = theta
+        self.loops = loops
+
+    def to_dict(self):
+        data = dict(self.loops)
+        data["position"] = self.position
+        data["theta"] = self.theta
+        return data
+
+    def __repr__(self):
+        return repr(self.to_dict())
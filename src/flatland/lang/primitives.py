@@ -1,16 +1,20 @@
 # From Peter Norvig's (How to Write a (Lisp) Interpreter (in Python))
 # https://norvig.com/lang.html
 # https://norvig.com/lis.py
+import hashlib
 import json
 import logging
 import math
 import operator as op
 import os
 import random
-from datetime import datetime
+import threading
 
-import flatland.utils.config as CONFIG
+from flatland.lang.packet import Packet
+from flatland.lang.scheduler import get_scheduler
 from flatland.library import check_internal_dir
+from flatland.library import get_internal_dir
+from flatland.utils.context import DEFAULT_CONTEXT
 from flatland.utils.randomizer import GENERATE_NODEID
 from flatland.utils.randomizer import get_randomizer
 
@@ -24,7 +28,8 @@ def isconst(x):
 
 
 class Symbol(str):
-    pass
+    def lookup(self, env):
+        return env.find(self)[self]
 
 
 class Number(float):
@@ -44,13 +49,37 @@ class List(list):
             return ans
 
 
+def clone(x):
+    """A copy of the lists in expression x, sharing its atoms, so that a
+    parsed program can be run many times while evalf rewrites the copies."""
+    if isinstance(x, list):
+        return type(x)([clone(a) for a in x])
+    return x
+
+
 class Env(dict):
     "An environment: a dict of {'var': val} pairs, with an outer Env."
 
+    __slots__ = ("outer", "globl", "_name", "seed", "includes", "context", "shadowed")
+
     def __init__(self, parms=(), args=(), outer=None):
-        self.update(zip(parms, args))
+        if parms:
+            self.update(zip(parms, args))
         self.outer = outer
-        self.name = GENERATE_NODEID()
+        self.globl = self if outer is None else outer.globl
+        self._name = None
+
+    @property
+    def name(self):
+        # most environments are never named, so only generate the ones used
+        if self._name is None:
+            context = getattr(self.globl, "context", DEFAULT_CONTEXT)
+            self._name = GENERATE_NODEID(context.names)
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        self._name = value
 
     def find(self, var):
         "Find the innermost Env where var appears."
@@ -61,15 +90,60 @@ class Env(dict):
         else:
             raise AttributeError(f"Unable to find {var}")
 
+    def assign(self, var, value):
+        "Set var in the innermost Env where it appears."
+        env = self.find(var)
+        if isinstance(env, Builtins):
+            # the builtins are shared, so the program's global Env shadows them
+            env = self.globl
+        env[var] = value
+
+    def fork(self, context=None):
+        """A copy of this global Env, sharing its builtins and everything bound
+        so far, so that another program can run from the same starting point.
+        The copy runs in the given RunContext, or in the same one as this Env."""
+        env = Env(outer=self.outer)
+        dict.update(env, self)
+        env.globl = env
+        env.name = self.name
+        env.seed = self.seed
+        env.includes = set(self.includes)
+        env.shadowed = set(self.shadowed)
+        env.context = self.context if context is None else context
+        bind_random(env)
+        return env
+
+
+class Builtins(Env):
+    "The Scheme standard procedures, shared read-only by every global Env."
+
+    __slots__ = ()
+
+    def __init__(self, bindings):
+        dict.update(self, bindings)
+        self.outer = None
+        self.globl = self
+        self.name = "__builtins__"
+
+    def readonly(self, *args, **kwargs):
+        raise TypeError("builtins are read-only")
+
+    __setitem__ = __delitem__ = readonly
+    clear = pop = popitem = setdefault = update = readonly
+
 
 class Procedure:
     "A user-defined Scheme procedure."
 
+    __slots__ = ("parms", "body", "env")
+
     def __init__(self, parms, body, env):
         self.parms, self.body, self.env = parms, body, env
 
     def __call__(self, *args):
-        return evalf(self.body, Env(self.parms, args, self.env))
+        env = Env(self.parms, args, self.env)
+        shadow(env, self.parms)
+        return evalf(self.body, env)
 
 
 Atom = (Symbol, Number)
@@ -77,15 +151,14 @@ Exp = (Atom, List)
 
 
 def validate_message(callmethod):
-    def wrapper(self, data0):
-        if data0.get("position", None):
-            CONFIG.TURTLE.moveto(data0["position"])
-            if data0.get("theta", None) is not None:
-                CONFIG.TURTLE.setheading(data0["theta"])
-            # python objects are by reference
-            # but we need a copy of data to avoid overwrites
-            # so copy the dictionary
-            data = dict(**data0)
+    def wrapper(self, data):
+        if data.position:
+            turtle = self.context.turtle
+            turtle.moveto(data.position)
+            if data.theta is not None:
+                turtle.setheading(data.theta)
+            # packets are shared by reference, so they are never modified,
+            # nodes forward new packets instead
             return callmethod(self, data)
         return []
 
@@ -93,6 +166,7 @@ def validate_message(callmethod):
 
 
 class Node(Procedure):
+    __slots__ = ("name", "sources", "targets", "context")
     tp = "<unk>"
 
     def __init__(self, name, parent_env):
@@ -100,10 +174,11 @@ class Node(Procedure):
         self.name = name
         self.sources = []
         self.targets = {"out": []}
+        self.context = parent_env.globl.context
 
-    def forward(self, outdata):
-        outdata["position"] = CONFIG.TURTLE.position()
-        outdata["theta"] = CONFIG.TURTLE.heading()
+    def forward(self, data):
+        turtle = self.context.turtle
+        outdata = Packet(turtle.position(), turtle.heading(), data.loops)
         results = []
         for i, nodename in enumerate(self.targets["out"]):
             results.append((self.name, nodename, outdata))
@@ -140,6 +215,7 @@ class Node(Procedure):
 
 
 class LoopNode(Node):
+    __slots__ = ("start", "end", "varname", "_resolved_name")
     randomizer = get_randomizer("int", [1, 360])
     tp = "loop"
 
@@ -148,39 +224,49 @@ class LoopNode(Node):
         self.start = evalf(start, self.env)
         self.end = evalf(end, self.env)
         self.varname = varname
-        self.resolved_name = f"{self.env.name}:{self.varname}"
+        self._resolved_name = None
         self.targets["body"] = []
 
-        if CONFIG.RANDOMIZE and CONFIG.RUN and parent_env.outer.name == "__global__":
+        context = self.context
+        if context.randomize and context.run and parent_env.outer is parent_env.globl:
             if isconst(end) and isconst(start):
                 self.start = 0
-                self.end = self.randomizer()
+                self.end = self.randomizer(rng=context.rng, slot=f"{name}.end")
                 end = self.end
                 start = self.start
                 logger.info(f"randomizing end for {self.name}: {self.end}")
 
+    @property
+    def resolved_name(self):
+        if self._resolved_name is None:
+            self._resolved_name = f"{self.env.name}:{self.varname}"
+        return self._resolved_name
+
     @property
     def parameters(self):
         return self.varname, self.start, self.end
 
-    def forward(self, outdata):
-        outdata["position"] = CONFIG.TURTLE.position()
-        outdata["theta"] = CONFIG.TURTLE.heading()
+    def forward(self, data, count):
         results = []
-        in_loop = outdata[self.resolved_name] < self.end
-        targets = self.targets["body"] if in_loop else self.targets["out"]
-        if not in_loop:
-            outdata.pop(self.resolved_name)
+        in_loop = count < self.end
+        if in_loop:
+            targets = self.targets["body"]
+            loops = data.loops.set(self.resolved_name, count)
+        else:
+            targets = self.targets["out"]
+            loops = data.loops.remove(self.resolved_name)
+        turtle = self.context.turtle
+        outdata = Packet(turtle.position(), turtle.heading(), loops)
         for i, nodename in enumerate(targets):
             results.append((self.name, nodename, outdata))
         return results
 
     @validate_message
     def __call__(self, data):
-        data[self.resolved_name] = data.get(self.resolved_name, self.start - 1)
-        if data[self.resolved_name] < self.end:
-            data[self.resolved_name] = data[self.resolved_name] + 1
-        return self.forward(data)
+        count = data.loops.get(self.resolved_name, self.start - 1)
+        if count < self.end:
+            count = count + 1
+        return self.forward(data, count)
 
     def to_dict(self):
         a = super().to_dict()
@@ -197,6 +283,7 @@ class LoopNode(Node):
 
 
 class MoveNode(Node):
+    __slots__ = ("dist", "penup")
     dist_randomizer = get_randomizer("float", [0, 60])
     penup_randomizer = get_randomizer("bool", 0.1)
     tp = "move"
@@ -206,23 +293,27 @@ class MoveNode(Node):
         self.dist = evalf(dist, self.env)
         self.penup = bool(evalf(penup, self.env))
 
-        if CONFIG.RANDOMIZE and CONFIG.RUN and parent_env.outer.name == "__global__":
+        context = self.context
+        if context.randomize and context.run and parent_env.outer is parent_env.globl:
             if isconst(dist):
-                self.dist = self.dist_randomizer()
+                self.dist = self.dist_randomizer(rng=context.rng, slot=f"{name}.dist")
                 logger.info(f"randomizing dist for {self.name}: {self.dist}")
                 dist = self.dist
             if isconst(penup):
-                self.penup = self.penup_randomizer()
+                self.penup = self.penup_randomizer(
+                    rng=context.rng, slot=f"{name}.penup"
+                )
                 logger.info(f"randomizing penup for {self.name}: {self.penup}")
                 penup = self.penup
 
     @validate_message
     def __call__(self, data):
+        turtle = self.context.turtle
         if self.penup:
-            CONFIG.TURTLE.penup()
-        CONFIG.TURTLE.forward(self.dist)
+            turtle.penup()
+        turtle.forward(self.dist)
         if self.penup:
-            CONFIG.TURTLE.pendown()
+            turtle.pendown()
         return self.forward(data)
 
     @property
@@ -247,21 +338,23 @@ class MoveNode(Node):
 
 
 class TurnNode(Node):
+    __slots__ = ("theta",)
     randomizer = get_randomizer("int", [0, 360])
     tp = "turn"
 
     def __init__(self, name, theta, parent_env):
         super().__init__(name, parent_env)
         self.theta = evalf(theta, self.env)
-        if CONFIG.RANDOMIZE and CONFIG.RUN and parent_env.outer.name == "__global__":
+        context = self.context
+        if context.randomize and context.run and parent_env.outer is parent_env.globl:
             if isconst(theta):
-                self.theta = self.randomizer()
+                self.theta = self.randomizer(rng=context.rng, slot=f"{name}.theta")
                 logger.info("randomizing theta for {self.name}: {self.theta}")
                 theta = self.theta
 
     @validate_message
     def __call__(self, data):
-        CONFIG.TURTLE.left(self.theta)
+        self.context.turtle.left(self.theta)
         return self.forward(data)
 
     @property
@@ -284,14 +377,21 @@ class TurnNode(Node):
 
 
 class Flow(Node):  # brain hurty
+    __slots__ = ("creator", "filename", "flowtype", "internal", "params")
     tp = "flow"
 
     class Internal:
-        def __init__(self, _id):
+        __slots__ = ("entries", "exits", "messages", "env")
+
+        def __init__(self, env):
             self.entries = set()
             self.exits = dict()
             self.messages = dict()
-            self.id = _id
+            self.env = env
+
+        @property
+        def id(self):
+            return self.env.name
 
         def add_entry(self, node):
             self.entries.add(node)
@@ -324,12 +424,14 @@ class Flow(Node):  # brain hurty
     def __init__(self, name, creator, filename, tp, params, opts, body, parent_env):
         super().__init__(name, parent_env)
         optvals = [evalf(x, self.env) for x in opts]
+        shadow(self.env, params)
+        shadow(self.env, ("__internal__",))
         self.env.update(zip(params, optvals))
         self.creator = creator
         self.filename = filename
         self.flowtype = tp
         self.body = body
-        self.internal = Flow.Internal(self.id)
+        self.internal = Flow.Internal(self.env)
         self.params = params
         self.env["__internal__"] = self.internal
 
@@ -338,22 +440,35 @@ class Flow(Node):  # brain hurty
         return tuple(self.env[k] for k in self.params)
 
     def install(self):
-        for expr in self.body:
+        context = self.context
+        body = self.body
+        if context.randomize and context.run:
+            if self.filename != self.env.globl.get("__file__"):
+                # randomized values are written back only into the running
+                # program, included flows are shared by other programs
+                body = clone(body)
+        for expr in body:
             evalf(expr, self.env)
 
     def __call__(self, data):
-        messages = [("__internal__", snode, data) for snode in self.internal.entries]
+        messages = get_scheduler(self.context.scheduler)(
+            ("__internal__", snode, data) for snode in self.internal.entries
+        )
+        tracer = self.context.tracer
         while len(messages) > 0:
-            msg = messages.pop(0)
-            fnode, tnode, data = msg
+            fnode, tnode, data = messages.pop()
+            if tracer is not None:
+                tracer(self, fnode, tnode, data)
             if tnode == "__internal__":
                 self.internal(data, fnode)
             elif data:
-                results = self.env[tnode](data)
-                messages.extend(results)
-            if self.env.outer.name == "__global__":
-                logger.info(f"Processing: {msg}")
-                logger.info(f"yet to process: {messages}\n")
+                if tracer is None:
+                    results = self.env[tnode](data)
+                else:
+                    results = tracer.call(self.env[tnode], data)
+                messages.push(results)
+        if tracer is not None:
+            tracer.finish(messages)
         return self.forward(None)
 
     def forward(self, data):
@@ -361,7 +476,7 @@ class Flow(Node):  # brain hurty
         for k in self.targets:
             for nodename in self.targets[k]:
                 for xdata in self.internal.messages[k]:
-                    results.append((self.name, nodename, dict(**xdata)))
+                    results.append((self.name, nodename, xdata))
         self.internal.clear()
         return results
 
@@ -400,13 +515,15 @@ class FlowCreator:
         self.filename = filename
 
     def __call__(self, name, opts, parent_env):
-        if CONFIG.RANDOMIZE and self.randoms:
+        context = parent_env.globl.context
+        if context.randomize and self.randoms:
             new_opts = []
             for i, x in enumerate(opts):
                 if not isconst(x):
                     new_opts.append(x)
                 else:
-                    opt = self.rfuncs[self.params[i]]()
+                    slot = f"{name}.{self.params[i]}"
+                    opt = self.rfuncs[self.params[i]](rng=context.rng, slot=slot)
                     logger.info(f"randomizing {self.params[i]} for {name} {opt}")
                     new_opts.append(opt)
         else:
@@ -500,21 +617,27 @@ def run_flow(env, flowname, rest):
         bname = os.path.basename(d.filename)
         flowname = f"__{bname}:{d.flowtype}__"
         flow = d(flowname, opts, env)
+        shadow(env, (flow.name,))
         env[flow.name] = flow
     elif isinstance(d, Flow):
         flow = d
     else:
         raise TypeError(f"cannot create flow from {flowname}")
 
-    if CONFIG.RUN and CONFIG.RANDOMIZE:
-        pos = (pos[0] + MoveNode.dist_randomizer(), pos[1] + MoveNode.dist_randomizer())
+    context = env.globl.context
+    if context.run and context.randomize:
+        rng = context.rng
+        pos = (
+            pos[0] + MoveNode.dist_randomizer(rng=rng, slot=f"{flow.name}.x"),
+            pos[1] + MoveNode.dist_randomizer(rng=rng, slot=f"{flow.name}.y"),
+        )
         pos = (pos[0] % 128, pos[1] % 128)
-        theta = TurnNode.randomizer()
+        theta = TurnNode.randomizer(rng=rng, slot=f"{flow.name}.theta")
 
     data = dict()
     data["params"] = dict(position=List(pos), theta=theta)
-    if CONFIG.RUN:
-        flow(data["params"])
+    if context.run:
+        flow(Packet(data["params"]["position"], theta))
         # print(flow)
     return flow, data
 
@@ -590,75 +713,163 @@ def resolve_scope(fdata):
     return flow
 
 
+# everything an #include adds to the global Env, keyed by
+# (library dir, filename, content hash), so that a file
+# is evaluated only once per process
+__INCLUDES__ = dict()
+# the stacks of includes being evaluated in each thread,
+# to record nested includes
+__INCLUDING__ = threading.local()
+
+
+class IncludeRecord:
+    "The names bound and the files included by evaluating an #include."
+
+    def __init__(self, bindings, includes, shadowed, nested):
+        self.bindings = bindings
+        self.includes = includes
+        self.shadowed = shadowed
+        self.nested = nested
+
+    def install(self, env):
+        for filename in self.nested:
+            include_file(filename, env)
+        env.update(self.bindings)
+        env.includes.update(self.includes)
+        env.shadowed.update(self.shadowed)
+
+
 def include_file(filename, env):
     assert filename.startswith('"') and filename.endswith(
         '"'
     ), "Filename needs to be a double-quoted string"
+    including = __INCLUDING__.__dict__.setdefault("stack", [])
+    if including:
+        including[-1].append(filename)
     filename = filename.replace('"', "")
-    globl = env.find("+")
+    globl = env.globl
+    context = globl.context
     is_internal, fullname = check_internal_dir(filename)
 
     if is_internal:
         localname = filename
     else:
         localname = None
+        # relative to the file that includes it
+        directory = context.directory or os.getcwd()
+        fullname = os.path.abspath(os.path.join(directory, filename))
 
     if filename not in env.includes:
+        from flatland.lang.run import CurrentDir
         from flatland.lang.run import main as runner
 
         with open(fullname) as f:
             subprogram = f.read()
 
-        t = CONFIG.RUN
-        CONFIG.RUN = False
-        runner(subprogram, filename, globl, localname)
-        CONFIG.RUN = t
-
-
-def standard_env() -> Env:
-    "An environment with some Scheme standard procedures."
-    env = Env()
+        digest = hashlib.sha1(subprogram.encode("utf-8")).hexdigest()
+        key = (get_internal_dir(), fullname, digest)
+        record = __INCLUDES__.get(key)
+        if record is not None:
+            # nested includes are relative to the included file
+            with CurrentDir(fullname, context):
+                record.install(globl)
+            return
+
+        before = dict(globl)
+        includes = set(globl.includes)
+        shadowed = set(globl.shadowed)
+        # nothing is drawn from the program's random stream while including,
+        # so its samples are the same whether or not the file was memoized
+        t, r, rng, names = context.run, context.randomize, context.rng, context.names
+        context.run = context.randomize = False
+        context.rng = context.names = None
+        including.append([])
+        try:
+            runner(subprogram, fullname, globl, localname)
+        finally:
+            nested = including.pop()
+            context.run, context.randomize, context.rng = t, r, rng
+            context.names = names
+        bindings = {
+            k: v for k, v in globl.items() if k not in before or before[k] is not v
+        }
+        bindings.pop("__file__", None)
+        __INCLUDES__[key] = IncludeRecord(
+            bindings, globl.includes - includes, globl.shadowed - shadowed, nested
+        )
+        logger.debug(f"memoized {filename} as {key}")
+
+
+BUILTINS = Builtins(
+    {
+        **vars(math),  # sin, cos, sqrt, pi, ...
+        "+": op.add,
+        "-": op.sub,
+        "*": op.mul,
+        "/": op.truediv,
+        "%": op.mod,
+        "=": op.eq,
+        ">": op.gt,
+        "<": op.lt,
+        ">=": op.ge,
+        "<=": op.le,
+        "begin": lambda *x: x[-1],
+        "abs": abs,
+        "apply": lambda proc, args: proc(*args),
+        "expt": pow,
+        "map": map,
+        "max": max,
+        "min": min,
+        "not": op.not_,
+        "null?": lambda x: x == [],
+        "number?": lambda x: isinstance(x, Number),
+        "print": print,
+        "procedure?": callable,
+        "round": round,
+        "symbol?": lambda x: isinstance(x, Symbol),
+    }
+)
+
+
+def bind_random(env):
+    "Bind the procedures that draw from the random stream of env's context."
+    rng = env.context.rng
+    env["randint"] = random.randint if rng is None else rng.randint
+
+
+def standard_env(context=None) -> Env:
+    """An environment with some Scheme standard procedures,
+    to run programs in the given RunContext, or the default one."""
+    env = Env(outer=BUILTINS)
+    env.globl = env
     env.name = "__global__"
-    env.seed = datetime.now()
     env.includes = set()
-    random.seed(env.seed)
-    env.update(vars(math))  # sin, cos, sqrt, pi, ...
-    env.update(
-        {
-            "+": op.add,
-            "-": op.sub,
-            "*": op.mul,
-            "/": op.truediv,
-            "%": op.mod,
-            "=": op.eq,
-            ">": op.gt,
-            "<": op.lt,
-            ">=": op.ge,
-            "<=": op.le,
-            "begin": lambda *x: x[-1],
-            "abs": abs,
-            "apply": lambda proc, args: proc(*args),
-            "expt": pow,
-            "map": map,
-            "max": max,
-            "min": min,
-            "not": op.not_,
-            "null?": lambda x: x == [],
-            "number?": lambda x: isinstance(x, Number),
-            "print": print,
-            "procedure?": callable,
-            "round": round,
-            "symbol?": lambda x: isinstance(x, Symbol),
-            "randint": random.randint,
-        }
-    )
+    env.shadowed = set()
+    env.context = DEFAULT_CONTEXT if context is None else context
+    env.seed = None
+    bind_random(env)
     return env
 
 
+def shadow(env, names):
+    """Record that names are bound in env, when it is not a global Env,
+    so that global references with these names look through the Envs."""
+    if env is not env.globl:
+        env.globl.shadowed.update(names)
+
+
+def write_drawn(x, env, items):
+    """Replace expression x in place with items, the same form with the
+    values drawn for it, when env's program is randomized and run."""
+    context = env.globl.context
+    if context.randomize and context.run:
+        x[:] = items
+
+
 def evalf(x, env):  # noqa: C901
     "Evaluate an expression in an environment."
     if isinstance(x, Symbol):  # variable reference
-        return env.find(x)[x]
+        return x.lookup(env)
     elif not isinstance(x, List):  # constant
         return x
     if len(x) == 0:
@@ -676,11 +887,9 @@ def evalf(x, env):  # noqa: C901
     elif op == "create-node":
         name, tp, *tpargs = args
         node = node_creator(env, name, tp, *tpargs)
+        shadow(env, (name,))
         env[name] = node
-        if CONFIG.RANDOMIZE and CONFIG.RUN:
-            x2 = List([op, name, tp, *node.parameters])
-            x.clear()
-            x.extend(x2)
+        write_drawn(x, env, [op, name, tp, *node.parameters])
     elif op == "define-flow":
         tp, params, randoms, body = args
         filename = env.find("__file__")["__file__"]
@@ -689,11 +898,9 @@ def evalf(x, env):  # noqa: C901
             parname, (rfunc, rparams) = rdp
             rparams = [evalf(bd, env) for bd in rparams]
             rddict[parname] = (rfunc, rparams)
+        shadow(env, (tp,))
         env[tp] = FlowCreator(tp, params, rddict, body, filename)
-        if CONFIG.RANDOMIZE and CONFIG.RUN:
-            x2 = List([op, tp, params, List(), body])
-            x.clear()
-            x.extend(x2)
+        write_drawn(x, env, [op, tp, params, List(), body])
 
     elif op == "create-entry":
         node = args[0]
@@ -708,25 +915,16 @@ def evalf(x, env):  # noqa: C901
     elif op == "run-flow":
         flowname, *rest = args
         flow, start = run_flow(env, flowname, rest)
-        if CONFIG.RANDOMIZE and CONFIG.RUN:
-            x2 = List(
-                [
-                    op,
-                    flowname,
-                    List(flow.parameters),
-                    start["params"]["position"],
-                    start["params"]["theta"],
-                ]
-            )
-            x.clear()
-            x.extend(x2)
+        position, theta = start["params"]["position"], start["params"]["theta"]
+        write_drawn(x, env, [op, flowname, List(flow.parameters), position, theta])
         return format_static(flow, start)
     elif op == "define":  # definition
         (symbol, exp) = args
+        shadow(env, (symbol,))
         env[symbol] = evalf(exp, env)
     elif op == "set":  # assignment
         (symbol, exp) = args
-        env.find(symbol)[symbol] = evalf(exp, env)
+        env.assign(symbol, evalf(exp, env))
     elif op == "lambda":  # procedure
         (parms, body) = args
         return Procedure(parms, body, env)
@@ -0,0 +1,107 @@
+# lexical addressing: annotate every variable reference with where it is bound,
+# so that lookups don't have to walk the chain of environments
+from flatland.lang.primitives import BUILTINS
+from flatland.lang.primitives import List
+from flatland.lang.primitives import Symbol
+
+
+class LocalRef(Symbol):
+    "A symbol bound lexically, depth environments outward from where it is used."
+
+    def __new__(cls, name, depth):
+        self = super().__new__(cls, name)
+        self.depth = depth
+        return self
+
+    def __getnewargs__(self):
+        return str(self), self.depth
+
+    def lookup(self, env):
+        target = env
+        for _ in range(self.depth):
+            target = target.outer
+        if self in target:
+            return target[self]
+        return env.find(self)[self]
+
+
+class GlobalRef(Symbol):
+    "A symbol that is not bound lexically, so it is looked up in the global Env."
+
+    def lookup(self, env):
+        globl = env.globl
+        # a name that is bound in an Env other than the global one
+        # could be shadowed on the way out, so it has to be found
+        if self not in globl.shadowed:
+            if self in globl:
+                return globl[self]
+            elif self in BUILTINS:
+                return BUILTINS[self]
+        return env.find(self)[self]
+
+
+def bind(scopes, name):
+    if scopes:
+        scopes[-1].add(name)
+
+
+def resolve_symbol(x, scopes):
+    for depth, scope in enumerate(reversed(scopes)):
+        if x in scope:
+            return LocalRef(x, depth)
+    return GlobalRef(x)
+
+
+def resolve(x, scopes=None):  # noqa: C901
+    """Replace the variable references in x with LocalRef/GlobalRef symbols.
+    scopes is the stack of names bound by the enclosing lambdas and flows."""
+    if scopes is None:
+        scopes = []
+    if isinstance(x, Symbol):
+        return resolve_symbol(x, scopes)
+    elif not isinstance(x, List) or len(x) == 0:
+        return x
+    op, *args = x
+    if op in ("quote", "#include", "create-entry", "create-exit", "create-link"):
+        pass
+    elif op == "if":
+        x[1:] = [resolve(a, scopes) for a in args]
+    elif op == "create-node":
+        name, tp, *tpargs = args
+        bind(scopes, name)
+        # node arguments are evaluated in the (empty) Env of the new node,
+        # and the loop variable is just a name
+        skip = 1 if tp == "loop" else 0
+        inner = scopes + [set()]
+        x[3 + skip :] = [resolve(a, inner) for a in tpargs[skip:]]
+    elif op == "define-flow":
+        tp, params, randoms, body = args
+        for parname, (rfunc, rparams) in randoms:
+            rparams[:] = [resolve(a, scopes) for a in rparams]
+        bind(scopes, tp)
+        # the body runs in the Env of each flow instance, whose outer Env
+        # is the caller's, so the enclosing scopes are not visible from it
+        names = set(params)
+        names.add("__internal__")
+        for expr in body:
+            if isinstance(expr, List) and len(expr) > 1 and expr[0] == "create-node":
+                names.add(expr[1])
+        body[:] = [resolve(expr, [names]) for expr in body]
+    elif op == "run-flow":
+        flowname, opts, *rest = args
+        # options are evaluated in the (empty) Env of the new flow
+        inner = scopes + [set()]
+        opts[:] = [resolve(a, inner) for a in opts]
+    elif op == "define":
+        (symbol, exp) = args
+        x[2] = resolve(exp, scopes)
+        bind(scopes, symbol)
+    elif op == "set":
+        (symbol, exp) = args
+        x[2] = resolve(exp, scopes)
+    elif op == "lambda":
+        (parms, body) = args
+        x[2] = resolve(body, scopes + [set(parms)])
+    else:  # procedure call
+        x[:] = [resolve(a, scopes) for a in x]
+    return x
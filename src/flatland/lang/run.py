@@ -6,26 +6,35 @@ import json
 import os
 
 import flatland.utils.config as CONFIG
+from flatland.lang.cache import get_cache
 from flatland.lang.fbp import parse as parse_fbp
 from flatland.lang.lisp import parse as parse_lisp
 from flatland.lang.primitives import evalf
+from flatland.lang.primitives import include_file
+from flatland.lang.primitives import List
 from flatland.lang.primitives import standard_env
+from flatland.lang.resolver import resolve
 from flatland.utils.modding import finalize
 from flatland.utils.modding import initialize
+from flatland.utils.raster import NumpyTurtle
+from flatland.utils.raster import rasterize_many
 
 
 class CurrentDir:
-    def __init__(self, filename):
-        self.prev_dir = os.path.abspath(os.getcwd())
+    "Find relative #includes next to filename, while running in context."
+
+    def __init__(self, filename, context):
+        self.context = context
+        self.prev_dir = context.directory
         self.cur_dir = os.path.abspath(os.path.dirname(filename))
 
     def __enter__(self):
         # print("Switching to", self.cur_dir)
-        os.chdir(self.cur_dir)
+        self.context.directory = self.cur_dir
 
     def __exit__(self, type, value, traceback):
         # print("Switching back to", self.prev_dir)
-        os.chdir(self.prev_dir)
+        self.context.directory = self.prev_dir
         if type:
             print(type, value, traceback)
 
@@ -33,12 +42,17 @@ class CurrentDir:
 def parse_flow(program: str, filename: str):
     ext = os.path.splitext(filename)[1]
     if ".fbp" in ext:
-        expr = parse_fbp(program)
+        parser = parse_fbp
     elif ".lisp" in ext:
-        expr = parse_lisp(program)
+        parser = parse_lisp
     else:
         raise ValueError(f"Invalid file extension {ext}, expecting .fbp or .lisp")
-    return expr
+    if CONFIG.CACHE_DIR is not None:
+        cache = get_cache(CONFIG.CACHE_DIR, CONFIG.CACHE_SIZE)
+        expr = cache.parse(program, ext, parser)
+    else:
+        expr = parser(program)
+    return resolve(expr)
 
 
 def exec_flow(expr, filename: str, env=None):
@@ -57,17 +71,62 @@ def exec_flow(expr, filename: str, env=None):
     return flowdata
 
 
-def main(program: str, filename: str, env=None, localname=None):
-    initialize()  # technically, init only after parsing
+def main(program: str, filename: str, env=None, localname=None, expr=None):
+    """Run program from filename in env, and return its expression and data.
+    If expr is given, it is the already parsed program, which is run instead,
+    and rewritten in place if the program is randomized."""
+    if env is None:
+        env = standard_env()
+    context = env.globl.context
+    if context.run:  # nothing is drawn otherwise
+        initialize(context)  # technically, init only after parsing
     filename = os.path.abspath(filename)
     if localname is None:
         localname = filename
-    with CurrentDir(filename):
-        expr = parse_flow(program, localname)
+    with CurrentDir(filename, context):
+        if expr is None:
+            expr = parse_flow(program, localname)
         flowdata = exec_flow(expr, localname, env)
-    if CONFIG.RUN:  # drawing happened
+    if context.run:  # drawing happened
         basename = os.path.basename(filename)
         cur_dir = os.getcwd()
         localname = os.path.join(cur_dir, basename)
-        finalize(localname)
+        finalize(localname, context)
     return expr, flowdata
+
+
+def load_includes(program: str, filename: str, env=None, expr=None):
+    """A global Env with the files included by program already evaluated,
+    to fork() a fresh copy of for every run of the program.
+    expr is the already parsed program, if it is not parsed here."""
+    if env is None:
+        env = standard_env()
+    filename = os.path.abspath(filename)
+    with CurrentDir(filename, env.globl.context):
+        if expr is None:
+            expr = parse_flow(program, filename)
+        for x in expr:
+            if isinstance(x, List) and len(x) > 1 and x[0] == "#include":
+                include_file(x[1], env)
+    return env
+
+
+def render_many(programs, size=256, ext=".fbp", env=None):
+    """Run a list of programs (strings in the format given by ext, or parsed
+    expressions) in a fork of env, and draw them into a (N, size, size)
+    uint8 array with a single batched rasterization. The programs draw with
+    a turtle of their own, so render_many can be called from many threads."""
+    if env is None:
+        env = standard_env()
+    turtle = NumpyTurtle()
+    env = env.fork(env.context.copy(turtle=turtle, run=True))
+    segments = []
+    for program in programs:
+        if isinstance(program, str):
+            expr = parse_flow(program, "<program>" + ext)
+        else:
+            expr = program
+        exec_flow(expr, "<program>" + ext, env)
+        segments.append(turtle.strokes.segments())
+        turtle.clear()
+    return rasterize_many(segments, size)
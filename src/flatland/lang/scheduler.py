@@ -0,0 +1,83 @@
+# the queues of information packets that a Flow processes,
+# each message is a (from node, to node, data) tuple
+from collections import deque
+
+
+class FifoScheduler:
+    "Process messages in the order they were sent."
+
+    def __init__(self, messages=()):
+        self.queue = deque(messages)
+        self.processed = 0
+        self.high_water = len(self.queue)
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __iter__(self):
+        return iter(self.queue)
+
+    def push(self, messages):
+        self.queue.extend(messages)
+        if len(self) > self.high_water:
+            self.high_water = len(self)
+
+    def pop(self):
+        self.processed += 1
+        return self.queue.popleft()
+
+
+class DepthFirstScheduler(FifoScheduler):
+    "Follow the messages sent by a node before going back to its siblings."
+
+    def __init__(self, messages=()):
+        super().__init__(reversed(list(messages)))
+
+    def push(self, messages):
+        super().push(reversed(messages))
+
+    def pop(self):
+        self.processed += 1
+        return self.queue.pop()
+
+
+class BatchedScheduler(FifoScheduler):
+    """Process the messages in rounds, where every round runs the messages
+    pending at its start, grouped by the node they are sent to."""
+
+    def __init__(self, messages=()):
+        super().__init__(messages)
+        self.batch = deque()
+
+    def __len__(self):
+        return len(self.batch) + len(self.queue)
+
+    def __iter__(self):
+        yield from self.batch
+        yield from self.queue
+
+    def pop(self):
+        if not self.batch:
+            groups = dict()
+            for msg in self.queue:
+                groups.setdefault(msg[1], []).append(msg)
+            self.queue.clear()
+            for msgs in groups.values():
+                self.batch.extend(msgs)
+        self.processed += 1
+        return self.batch.popleft()
+
+
+SCHEDULERS = {
+    "fifo": FifoScheduler,
+    "depth-first": DepthFirstScheduler,
+    "batched": BatchedScheduler,
+}
+
+
+def get_scheduler(policy):
+    if policy not in SCHEDULERS:
+        raise ValueError(
+            f"unknown scheduler {policy}, expecting one of {list(SCHEDULERS)}"
+        )
+    return SCHEDULERS[policy]
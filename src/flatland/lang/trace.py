@@ -0,0 +1,59 @@
+# an optional hook on the packets processed by flows, for debugging and
+# profiling; nothing is formatted or timed unless a Tracer is installed
+import logging
+import time
+
+logger = logging.getLogger("flatland.lang.trace")
+
+
+def log_packet(flow, fnode, tnode, data):
+    "The default sink, which logs every packet it receives."
+    logger.info("%s: %s -> %s %s", flow.name, fnode, tnode, data)
+
+
+class Tracer:
+    """Send every sample-th packet processed by a flow to sink, as
+    (flow, from node, to node, data), and count and time the calls to
+    each type of node. Times of flows include the nodes inside them.
+    Also total the packets the schedulers of the flows processed, and
+    the longest any of their queues got."""
+
+    def __init__(self, sink=log_packet, sample=1):
+        self.sink = sink
+        self.sample = sample
+        self.reset()
+
+    def reset(self):
+        self.events = 0
+        self.counts = dict()
+        self.times = dict()
+        self.processed = 0
+        self.high_water = 0
+
+    def __call__(self, flow, fnode, tnode, data):
+        self.events += 1
+        if self.sink is not None and self.events % self.sample == 0:
+            self.sink(flow, fnode, tnode, data)
+
+    def call(self, node, data):
+        start = time.perf_counter()
+        results = node(data)
+        elapsed = time.perf_counter() - start
+        tp = getattr(node, "flowtype", node.tp)
+        self.counts[tp] = self.counts.get(tp, 0) + 1
+        self.times[tp] = self.times.get(tp, 0.0) + elapsed
+        return results
+
+    def finish(self, messages):
+        "Add the counters of the scheduler of a flow that finished."
+        self.processed += messages.processed
+        self.high_water = max(self.high_water, messages.high_water)
+
+    def packets(self):
+        return {"processed": self.processed, "high_water": self.high_water}
+
+    def to_dict(self):
+        return {
+            tp: {"count": self.counts[tp], "seconds": self.times[tp]}
+            for tp in self.counts
+        }
@@ -14,6 +14,7 @@ from flatland.lang.primitives import Flow
 from flatland.lang.primitives import Node
 from flatland.lang.primitives import standard_env
 from flatland.lang.run import main as runner
+from flatland.utils.context import RunContext
 from flatland.utils.misc import check_dir
 
 
@@ -73,9 +74,8 @@ class Library:
         return json.dumps(self, indent=4, cls=Encoder)
 
     def fill_dependencies(self):
-        env = standard_env()
-        CONFIG.RANDOMIZE = False
-        CONFIG.RUN = False
+        # the flows are only defined, nothing is randomized or drawn
+        env = standard_env(RunContext())
         for file in self.files:
             with open(file) as f:
                 prog = f.read()
@@ -86,13 +86,15 @@ class Library:
                 self.add_primitive(v)
 
     def _generate_programs(self, N, output_dir):
-        rd, run = CONFIG.RANDOMIZE, CONFIG.RUN
+        context = RunContext(
+            backend=CONFIG.BACKEND,
+            scheduler=CONFIG.SCHEDULER,
+        )
         for i in range(N):
             file = random.choice(self.files)
             with open(file) as f:
                 prog = f.read()
-            single_file(prog, file, 1, output_dir)
-        CONFIG.RANDOMIZE, CONFIG.RUN = rd, run
+            single_file(prog, file, 1, output_dir, context=context)
 
 
 class Encoder(json.JSONEncoder):
@@ -1,2 +1,3 @@
+from .graph import ProgramGraph
 from .image_dist import metric as image_distance
 from .program_dist import metric as program_distance
@@ -1,4 +1,6 @@
 # recursive comparison of properties
+from typing import NamedTuple
+
 import numpy as np
 
 
@@ -76,6 +78,76 @@ def node_weighter(node1, node2):
         return 0
 
 
+# the node types node_weighter compares, any other type has code 0
+TYPE_CODES = {"loop": 1, "move": 2, "turn": 3, "info": 4}
+
+
+class NodeColumns(NamedTuple):
+    "The nodes of a resolved spec, as typed columns for node_weights."
+    keys: list
+    tp: np.ndarray
+    start: np.ndarray
+    end: np.ndarray
+    dist: np.ndarray
+    penup: np.ndarray
+    theta: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+
+
+def encode_nodes(spec):
+    keys = list(spec.keys())
+    n = len(keys)
+    tp = np.zeros(n, dtype=np.int8)
+    cols = np.zeros((7, n), dtype=np.float64)
+    start, end, dist, penup, theta, x, y = cols
+    for i, k in enumerate(keys):
+        node = spec[k]
+        code = TYPE_CODES.get(node["type"], 0)
+        tp[i] = code
+        p = node["params"] if code else None
+        if code == 1:
+            start[i], end[i] = p["start"], p["end"]
+        elif code == 2:
+            dist[i], penup[i] = p["dist"], p["penup"]
+        elif code == 3:
+            theta[i] = p["theta"] % 360
+        elif code == 4:
+            theta[i] = p["theta"] % 360
+            x[i], y[i] = p["position"]
+    return NodeColumns(keys, tp, start, end, dist, penup, theta, x, y)
+
+
+def node_weights(cols1, cols2):
+    """The (len(cols1), len(cols2)) matrix of node_weighter between every
+    pair of nodes, computed for each type with broadcasting."""
+    answer = np.zeros((len(cols1.keys), len(cols2.keys)), dtype=np.float64)
+    for code in TYPE_CODES.values():
+        i = np.flatnonzero(cols1.tp == code)
+        j = np.flatnonzero(cols2.tp == code)
+        if len(i) == 0 or len(j) == 0:
+            continue
+        if code == 1:  # compare_loops
+            s1, e1 = cols1.start[i][:, None], cols1.end[i][:, None]
+            s2, e2 = cols2.start[j][None, :], cols2.end[j][None, :]
+            w = ((s1 == s2).astype(np.float64) + (e1 == e2)) / 2
+        elif code == 2:  # compare_moves
+            d1, p1 = cols1.dist[i][:, None], cols1.penup[i][:, None]
+            d2, p2 = cols2.dist[j][None, :], cols2.penup[j][None, :]
+            w = ((d1 == d2).astype(np.float64) + (p1 == p2)) / 2
+        else:  # compare_turns, and compare_info
+            t1, t2 = cols1.theta[i][:, None], cols2.theta[j][None, :]
+            w = np.maximum(0, 1 - np.abs(t1 - t2) / 360)
+            if code == 4:
+                x1, x2 = cols1.x[i][:, None], cols2.x[j][None, :]
+                y1, y2 = cols1.y[i][:, None], cols2.y[j][None, :]
+                px = np.round(np.maximum(0, 1 - np.abs(x1 - x2) / 128), 2)
+                py = np.round(np.maximum(0, 1 - np.abs(y1 - y2) / 128), 2)
+                w = (np.round((px + py) / 2, 2) + w) / 2
+        answer[np.ix_(i, j)] = w
+    return answer
+
+
 def get_edgetype(node1, node2):
     for t, v in node1["targets"].items():
         if node2["id"] in v:
@@ -83,6 +155,24 @@ def get_edgetype(node1, node2):
     return ""
 
 
+def edge_types(spec, keys):
+    """The (n, n) matrix of the codes of get_edgetype between the nodes of
+    spec, in the order of keys, and the list of the edge types of the codes,
+    where code 0 is no edge."""
+    index = {k: i for i, k in enumerate(keys)}
+    names = {"": 0}
+    answer = np.zeros((len(keys), len(keys)), dtype=np.int32)
+    for i, k in enumerate(keys):
+        for t, v in spec[k]["targets"].items():
+            code = names.setdefault(t, len(names))
+            for dst in v:
+                j = index.get(dst)
+                # the first edge type a node is found in is the one used
+                if j is not None and answer[i, j] == 0:
+                    answer[i, j] = code
+    return answer, list(names)
+
+
 def edge_indicator(node1a, node1b, node2a, node2b):
     # check the edge between the corresponding nodes
     et1 = get_edgetype(node1a, node1b)
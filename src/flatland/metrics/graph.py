@@ -0,0 +1,53 @@
+# a resolved spec preprocessed into arrays once,
+# so that it can be compared with many others
+from collections.abc import Mapping
+
+import numpy as np
+
+from flatland.metrics.distance import edge_types
+from flatland.metrics.distance import encode_nodes
+from flatland.metrics.distance import TYPE_CODES
+
+
+class ProgramGraph(Mapping):
+    """A resolved spec, which it still maps node ids to nodes of, with:
+    ids, the node ids in the order of their integer indices, and index;
+    nodes, the NodeColumns of their types and parameters;
+    edges, the (n, n) matrix of edge type codes, and edge_names of the codes;
+    degrees, the out-degree of every node;
+    type_counts and degree_counts, histograms of the node types and degrees."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.nodes = encode_nodes(spec)
+        self.ids = self.nodes.keys
+        self.index = {k: i for i, k in enumerate(self.ids)}
+        self.edges, self.edge_names = edge_types(spec, self.ids)
+        self.degrees = np.count_nonzero(self.edges, axis=1)
+        self.type_counts = np.bincount(self.nodes.tp, minlength=len(TYPE_CODES) + 1)
+        self.degree_counts = np.bincount(self.degrees)
+
+    def __getitem__(self, key):
+        return self.spec[key]
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def edges_as(self, other):
+        "The edges matrix, with the edge type codes of other."
+        if self.edge_names == other.edge_names:
+            return self.edges
+        codes = {t: i for i, t in enumerate(other.edge_names)}
+        # types other does not have are never equal to its codes
+        lookup = np.array([codes.get(t, -1) for t in self.edge_names], np.int32)
+        return lookup[self.edges]
+
+
+def as_graph(spec):
+    "spec as a ProgramGraph, if it isn't one already."
+    if isinstance(spec, ProgramGraph):
+        return spec
+    return ProgramGraph(spec)
@@ -9,7 +9,9 @@ import numpy as np
 
 from flatland.lang.primitives import resolve_scope
 from flatland.metrics.distance import edge_indicator
-from flatland.metrics.distance import node_weighter
+from flatland.metrics.distance import node_weights
+from flatland.metrics.distance import TYPE_CODES
+from flatland.metrics.graph import as_graph
 
 logger = logging.getLogger("flatland.metrics.program_dist")
 
@@ -21,13 +23,14 @@ class NodeMapping(NamedTuple):
 
 
 def get_nodemap(spec1, spec2):
-    nodemap = []
-    for k1, v1 in spec1.items():
-        for k2, v2 in spec2.items():
-            wt = node_weighter(v1, v2)
-            if wt > 0:  # if SLOW, use > 0.5
-                nodemap.append(NodeMapping(k1, k2, wt))
-    return nodemap
+    g1, g2 = as_graph(spec1), as_graph(spec2)
+    weights = node_weights(g1.nodes, g2.nodes)
+    rows, cols = np.nonzero(weights > 0)  # if SLOW, use > 0.5
+    keys1, keys2 = g1.ids, g2.ids
+    return [
+        NodeMapping(keys1[i], keys2[j], wt)
+        for i, j, wt in zip(rows.tolist(), cols.tolist(), weights[rows, cols].tolist())
+    ]
 
 
 def check_valid_mapping(corr, nmap, flow1, flow2):
@@ -45,21 +48,27 @@ def check_valid_mapping(corr, nmap, flow1, flow2):
 
 
 def simple_corr(nmap, flow1, flow2):
-    keys1 = set(flow1.keys())
-    keys2 = set(flow2.keys())
+    g1, g2 = as_graph(flow1), as_graph(flow2)
+    edges1, edges2 = g1.edges, g2.edges_as(g1)
+    keys1 = set(g1.keys())
+    keys2 = set(g2.keys())
     answer = []
     awt = 0
+    # node indices of the mappings in answer
+    mapped1, mapped2 = [], []
     for k1, k2, wt in sorted(nmap, key=lambda x: x[2], reverse=True):
         if k1 in keys1 and k2 in keys2:
-            valid = sum(
-                edge_indicator(flow1[k1], flow1[k1x], flow2[k2], flow2[k2x])
-                for (k1x, k2x, wtx) in answer
-            )
-            if valid == len(answer):
+            i, j = g1.index[k1], g2.index[k2]
+            # the same edges, and back-edges, as with every mapping so far
+            same = np.array_equal(edges1[i, mapped1], edges2[j, mapped2])
+            back = np.array_equal(edges1[mapped1, i], edges2[mapped2, j])
+            if same and back:
                 keys1.remove(k1)
                 keys2.remove(k2)
                 awt += wt
                 answer.append(NodeMapping(k1, k2, wt))
+                mapped1.append(i)
+                mapped2.append(j)
     logger.info(
         f"simple method gets a mapping of size {len(answer)}, with weight {awt}"
     )
@@ -82,21 +91,37 @@ def trim_node_mappings(nmap, basic, flow1, flow2):
     return smallermap
 
 
-def create_product_graph(nmap, flow1, flow2):
-    prodgraph = set()
-
-    for i, (k1a, k2a, wta) in enumerate(nmap):
-        for j in range(i + 1, len(nmap)):
-            k1b, k2b, wtb = nmap[j]
+def create_product_graph(nmap, flow1, flow2, chunksize=1 << 22):
+    """The (E, 2) uint64 array of the pairs (i, j), i < j, of mappings in
+    nmap that can be in the same correspondence, compared a block of rows
+    of at most chunksize pairs at a time."""
+    g1, g2 = as_graph(flow1), as_graph(flow2)
+    edges1, edges2 = g1.edges, g2.edges_as(g1)
+    a = np.array([g1.index[x[0]] for x in nmap], dtype=np.intp)
+    b = np.array([g2.index[x[1]] for x in nmap], dtype=np.intp)
+
+    prodgraph = []
+    n = len(nmap)
+    step = max(1, chunksize // max(n, 1))
+    for lo in range(0, n, step):
+        i = np.arange(lo, min(lo + step, n))[:, None]
+        j = np.arange(n)[None, :]
+        ai, aj, bi, bj = a[i], a[j], b[i], b[j]
+        valid = (
+            (i < j)
             # assert one-to-one mapping
-            if k1a == k1b or k2a == k2b:
-                continue
-
-            # can't just map everything, so there needs to some check of "common substructure"
-            if edge_indicator(flow1[k1a], flow1[k1b], flow2[k2a], flow2[k2b]):
-                prodgraph.add((i, j))
-
-    return list(prodgraph)
+            & (ai != aj)
+            & (bi != bj)
+            # can't just map everything, so there needs to some check of
+            # "common substructure": the same edges, and back-edges, between them
+            & (edges1[ai, aj] == edges2[bi, bj])
+            & (edges1[aj, ai] == edges2[bj, bi])
+        )
+        rows, cols = np.nonzero(valid)
+        prodgraph.append(np.stack([rows + lo, cols], axis=1))
+    if not prodgraph:
+        return np.zeros((0, 2), dtype=np.uint64)
+    return np.concatenate(prodgraph).astype(np.uint64)
 
 
 def density(pgraph, nmap):
@@ -112,7 +137,7 @@ def setup_weighted_clique(nmap, flow1, flow2, lower_bound=0):
 
 
 def large_graph_corr(pgraph, nmap, flow1, flow2, lower_bound=0):
-    pg_arr = np.array(pgraph, dtype=np.uint64) + 1
+    pg_arr = pgraph + np.uint64(1)
     # runtime error if vertex numbers has 0, so add 1 and subtract when finding subset
     weights = np.array([x[2] for x in nmap], dtype=np.float64)
     import cliquematch
@@ -156,7 +181,7 @@ def large_graph_corr(pgraph, nmap, flow1, flow2, lower_bound=0):
 def small_graph_corr(pgraph, nmap, flow1, flow2, lower_bound=0):
     G = nx.Graph()
     G.add_nodes_from(i + 1 for i in range(len(nmap)))
-    G.add_edges_from([(a + 1, b + 1) for a, b in pgraph])
+    G.add_edges_from((a + 1, b + 1) for a, b in pgraph.tolist())
     clique = max(
         nx.algorithms.clique.find_cliques(G),
         key=setup_weighted_clique(nmap, flow1, flow2, lower_bound=lower_bound),
@@ -186,7 +211,46 @@ def node_similarity(subset, nodemap, flow1, flow2):
         return 0
 
 
+def distance_bounds(graphs1, graphs2):
+    """The (len(graphs1), len(graphs2)) matrix of lower bounds on the distance
+    between every pair of ProgramGraphs. A correspondence maps nodes one to
+    one, to nodes of the same type, with weights of at most 1, so its score
+    is at most the number of nodes of each type both programs have."""
+    shape1, shape2 = (len(graphs1), len(TYPE_CODES)), (len(graphs2), len(TYPE_CODES))
+    counts1 = np.array([g.type_counts[1:] for g in graphs1], np.float64).reshape(shape1)
+    counts2 = np.array([g.type_counts[1:] for g in graphs2], np.float64).reshape(shape2)
+    sizes1 = np.array([len(g) for g in graphs1], np.float64)
+    sizes2 = np.array([len(g) for g in graphs2], np.float64)
+    score = np.minimum(counts1[:, None, :], counts2[None, :, :]).sum(axis=2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # the same expression as node_similarity
+        similarity = (score / sizes1[:, None]) * (score / sizes2[None, :])
+    empty = (sizes1[:, None] == 0) | (sizes2[None, :] == 0)
+    return np.where(empty, 1.0, 1 - similarity)
+
+
+def distance_bound(flow1, flow2):
+    """A tighter lower bound on the distance between two ProgramGraphs, from
+    their node weights: a node of each type is mapped at most once, with at
+    most the weight of its best match, and at most as many nodes of a type
+    are mapped as the smaller program has."""
+    flow1, flow2 = as_graph(flow1), as_graph(flow2)
+    if len(flow1) == 0 or len(flow2) == 0:
+        return 1.0
+    weights = node_weights(flow1.nodes, flow2.nodes)
+    score1 = score2 = 0.0
+    for code in TYPE_CODES.values():
+        best1 = weights[flow1.nodes.tp == code].max(axis=1, initial=0)
+        best2 = weights[:, flow2.nodes.tp == code].max(axis=0, initial=0)
+        k = min(len(best1), len(best2))
+        score1 += np.sort(best1)[::-1][:k].sum()
+        score2 += np.sort(best2)[::-1][:k].sum()
+    score = min(score1, score2)
+    return 1 - (score / len(flow1)) * (score / len(flow2))
+
+
 def compare_specs(flow1, flow2):
+    flow1, flow2 = as_graph(flow1), as_graph(flow2)
     nodemap = get_nodemap(flow1, flow2)
     # print("nodemap", nodemap)
 
@@ -218,6 +282,9 @@ def compare_specs(flow1, flow2):
 
 
 def metric(spec1, spec2):
+    """The distance between two resolved specs, or ProgramGraphs built from
+    them, to compare a program with many others without preprocessing it
+    every time."""
     # print(spec1)
     # print(spec2)
     return compare_specs(spec1, spec2)
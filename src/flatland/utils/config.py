@@ -7,3 +7,10 @@ RANDOMIZE = False
 SHOWTURTLE = False
 RUN = False
 SKIPIMAGE = False
+BACKEND = "tk"
+CACHE_DIR = None
+CACHE_SIZE = 64 * 1024 * 1024
+SCHEDULER = "fifo"
+TRACER = None
+RNG = None
+NAMES = None
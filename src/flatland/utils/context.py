@@ -0,0 +1,78 @@
+# the state of a run of the interpreter, which every global Env carries,
+# so that programs with different contexts can run in different threads
+import flatland.utils.config as CONFIG
+
+# the fields of a RunContext, and the globals in flatland.utils.config
+# that the default context keeps them in
+FIELDS = {
+    "inited": "inited",
+    "root": "ROOT",
+    "canvas": "CANVAS",
+    "screen": "SCREEN",
+    "turtle": "TURTLE",
+    "randomize": "RANDOMIZE",
+    "showturtle": "SHOWTURTLE",
+    "run": "RUN",
+    "skipimage": "SKIPIMAGE",
+    "backend": "BACKEND",
+    "scheduler": "SCHEDULER",
+    "tracer": "TRACER",
+    "rng": "RNG",
+    "names": "NAMES",
+}
+
+
+class RunContext:
+    """The turtle a program draws with, and the flags it runs with.
+    directory is where relative #includes are found, if not the current one.
+    rng is the random.Random that randomized values are drawn from, if not
+    the global random module, and names the one node names are drawn from,
+    if not their own global stream."""
+
+    def __init__(self, **kwargs):
+        self.inited = False
+        self.root = self.canvas = self.screen = self.turtle = None
+        self.randomize = self.showturtle = self.run = self.skipimage = False
+        self.backend = "tk"
+        self.scheduler = "fifo"
+        self.tracer = None
+        self.rng = None
+        self.names = None
+        self.directory = None
+        for k, v in kwargs.items():
+            if k not in FIELDS and k != "directory":
+                raise TypeError(f"invalid RunContext field {k}")
+            setattr(self, k, v)
+        if self.turtle is not None:
+            self.inited = True
+
+    def copy(self, **kwargs):
+        "A new context with the same flags, and the fields in kwargs replaced."
+        values = {field: getattr(self, field) for field in FIELDS}
+        values["directory"] = self.directory
+        values.update(kwargs)
+        return RunContext(**values)
+
+
+def config_property(name):
+    def fget(self):
+        return getattr(CONFIG, name)
+
+    def fset(self, value):
+        setattr(CONFIG, name, value)
+
+    return property(fget, fset)
+
+
+class ConfigContext(RunContext):
+    """The default context, which keeps its fields in the globals of
+    flatland.utils.config, so that setting those still works."""
+
+    def __init__(self):
+        self.directory = None
+
+
+for field, name in FIELDS.items():
+    setattr(ConfigContext, field, config_property(name))
+
+DEFAULT_CONTEXT = ConfigContext()
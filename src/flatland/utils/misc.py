@@ -1,5 +1,9 @@
 import os
 
+import flatland.utils.config as CONFIG
+from flatland.library import get_internal_dir
+from flatland.library import set_internal_dir
+
 
 def check_file(filename):
     if os.path.exists(filename) and os.path.isfile(filename):
@@ -11,3 +15,16 @@ def check_dir(s):
     if os.path.exists(s) and os.path.isdir(s):
         return os.path.abspath(s)
     raise NotADirectoryError(f"{s} is not a valid directory")
+
+
+def export_settings(names):
+    """The library folder, and the settings in flatland.utils.config with the
+    given names, to copy into a worker process with import_settings."""
+    return get_internal_dir(), {name: getattr(CONFIG, name) for name in names}
+
+
+def import_settings(library, settings):
+    "Set the library folder and the settings of the parent in a worker process."
+    set_internal_dir(library)
+    for name, value in settings.items():
+        setattr(CONFIG, name, value)
@@ -1,149 +1,84 @@
 import json
 import logging
 import os
-import turtle
 from io import BytesIO
-from tkinter import Canvas
-from tkinter import Tk
-from turtle import RawTurtle as BaseTurtle
-from turtle import TurtleScreen as BaseScreen
 
 from PIL import Image
 
-import flatland.utils.config as CONFIG
+from flatland.utils.context import DEFAULT_CONTEXT
+from flatland.utils.raster import NumpyTurtle
+from flatland.utils.raster import StrokeLog
 
 logger = logging.getLogger("flatland.utils.modding")
 
 
-class MyScreen(BaseScreen):
-    def __init__(self, canvas):
-        super().__init__(canvas)
-        self.tracer(1, 0)
+BACKENDS = ("tk", "numpy")
 
-    def setworldcoordinates(self, llx, lly, urx, ury):
-        """Set up a user defined coordinate-system.
-        Arguments:
-        llx -- a number, x-coordinate of lower left corner of canvas
-        lly -- a number, y-coordinate of lower left corner of canvas
-        urx -- a number, x-coordinate of upper right corner of canvas
-        ury -- a number, y-coordinate of upper right corner of canvas
-        Set up user coodinat-system and switch to mode 'world' if necessary.
-        This performs a screen.reset. If mode 'world' is already active,
-        all drawings are redrawn according to the new coordinates.
-        But ATTENTION: in user-defined coordinatesystems angles may appear
-        distorted. (see Screen.mode())
-        Example (for a TurtleScreen instance named screen):
-        >>> screen.setworldcoordinates(-10,-0.5,50,1.5)
-        >>> for _ in range(36):
-        ...     left(10)
-        ...     forward(0.5)
-        """
-        if self.mode() != "world":
-            self.mode("world")
-        xspan = float(urx - llx)
-        yspan = float(ury - lly)
-        wx, wy = self._window_size()
-        self.screensize(int(wx) - 20, int(wy) - 20)
-        oldxscale, oldyscale = self.xscale, self.yscale
-        self.xscale = self.canvwidth / xspan
-        self.yscale = self.canvheight / yspan
-        srx1 = llx * self.xscale
-        sry1 = -ury * self.yscale
-        srx2 = self.canvwidth + srx1
-        sry2 = self.canvheight + sry1
-        self._setscrollregion(srx1, sry1, srx2, sry2)
-        self._rescale(self.xscale / oldxscale, self.yscale / oldyscale)
-        self.update()
 
+def initialize(context=DEFAULT_CONTEXT):
+    if not context.inited:
+        context.inited = True
+        logger.info("Initializing turtle")
+        if context.backend not in BACKENDS:
+            raise ValueError(f"invalid drawing backend {context.backend}")
+        if context.backend == "numpy" and not context.showturtle:
+            logger.info("Using headless NumPy turtle")
+            context.turtle = NumpyTurtle()
+        elif context.showturtle:
+            import turtle
 
-class MyTurtle(BaseTurtle):
-    def __init__(self, screen):
-        super().__init__(screen)
-        self.speed(0)
-        self.width(1)
-        self.hideturtle()
-        self.assembly = []
-        self.cur_id = 0
-
-    def moveto(self, x, y=None):
-        self.penup()
-        self.goto(x, y)
-        self.pendown()
-
-    def moveby(self, x=0, y=0):
-        sx, sy = self.position()
-        self.penup()
-        self.goto(sx + x, sy + y)
-        self.pendown()
-
-    def clear(self):
-        BaseTurtle.clear(self)
-        self.assembly = []
-        self.cur_id = 0
-
-    def updatelog(self, type_, **kwargs):
-        obj = {"id": self.cur_id, "type": type_}
-        obj.update(kwargs)
-        self.cur_id += 1
-        self.assembly.append(obj)
-
-    def forward(self, distance):
-        BaseTurtle.forward(self, distance)
-        x, y = self.position()
-        while x < 0:
-            x = 128 + x
-        while y < 0:
-            y = 128 + y
-        x = x % 128
-        y = y % 128
-        self.penup()
-        self.setposition(x, y)
-        self.pendown()
-
+            from flatland.utils.tkturtle import MyTurtle
 
-def initialize():
-    if not CONFIG.inited:
-        CONFIG.inited = True
-        logger.info("Initializing turtle")
-        if CONFIG.SHOWTURTLE:
             logger.info("Using default Turtle/Screen objects with patched methods")
-            CONFIG.TURTLE = turtle.Turtle()
-            CONFIG.TURTLE.moveto = lambda *args: MyTurtle.moveto(CONFIG.TURTLE, *args)
-            CONFIG.TURTLE.moveby = lambda *args: MyTurtle.moveby(CONFIG.TURTLE, *args)
-            CONFIG.TURTLE.updatelog = lambda *args: MyTurtle.updatelog(
-                CONFIG.TURTLE, *args
-            )
-            CONFIG.TURTLE.clear = lambda *args: MyTurtle.clear(CONFIG.TURTLE, *args)
-            CONFIG.TURTLE.forward = lambda *args: MyTurtle.forward(CONFIG.TURTLE, *args)
-            CONFIG.SCREEN = CONFIG.TURTLE.getscreen()
-            CONFIG.SCREEN.tracer(1, 0)
-            CONFIG.SCREEN.setworldcoordinates(0, 0, 128, 128)
-            CONFIG.CANVAS = CONFIG.SCREEN.getcanvas()
+            t = turtle.Turtle()
+            t.strokes = StrokeLog()
+            t.moveto = lambda *args: MyTurtle.moveto(t, *args)
+            t.moveby = lambda *args: MyTurtle.moveby(t, *args)
+            t.updatelog = lambda *args: MyTurtle.updatelog(t, *args)
+            t.clear = lambda *args: MyTurtle.clear(t, *args)
+            t.forward = lambda *args: MyTurtle.forward(t, *args)
+            context.turtle = t
+            context.screen = t.getscreen()
+            context.screen.tracer(1, 0)
+            context.screen.setworldcoordinates(0, 0, 128, 128)
+            context.canvas = context.screen.getcanvas()
         else:
+            from tkinter import Canvas
+            from tkinter import Tk
+            from turtle import TurtleScreen as BaseScreen
+
+            from flatland.utils.tkturtle import MyScreen
+            from flatland.utils.tkturtle import MyTurtle
+
             logger.info("Using custom Turtle object with hidden screen")
-            CONFIG.ROOT = Tk()
-            CONFIG.ROOT.overrideredirect(1)
-            CONFIG.ROOT.withdraw()
+            context.root = Tk()
+            context.root.overrideredirect(1)
+            context.root.withdraw()
 
-            CONFIG.CANVAS = Canvas(master=CONFIG.ROOT, width=256, height=256)
-            CONFIG.CANVAS.configure(scrollregion=(0, 0, 256, 256))
-            BaseScreen._canvas = CONFIG.CANVAS
-            BaseScreen._root = CONFIG.ROOT
-            CONFIG.SCREEN = MyScreen(CONFIG.CANVAS)
-            CONFIG.SCREEN.setworldcoordinates(0, 0, 128, 128)
-            CONFIG.TURTLE = MyTurtle(CONFIG.SCREEN)
+            context.canvas = Canvas(master=context.root, width=256, height=256)
+            context.canvas.configure(scrollregion=(0, 0, 256, 256))
+            BaseScreen._canvas = context.canvas
+            BaseScreen._root = context.root
+            context.screen = MyScreen(context.canvas)
+            context.screen.setworldcoordinates(0, 0, 128, 128)
+            context.turtle = MyTurtle(context.screen)
 
-            assert CONFIG.TURTLE.getscreen() == CONFIG.SCREEN
-            assert CONFIG.SCREEN.getcanvas() == CONFIG.CANVAS
+            assert context.turtle.getscreen() == context.screen
+            assert context.screen.getcanvas() == context.canvas
 
 
-def finalize(fname):
-    if CONFIG.SKIPIMAGE:
+def finalize(fname, context=DEFAULT_CONTEXT):
+    if context.skipimage:
         return
-    if CONFIG.SHOWTURTLE:
+    if context.showturtle:
         input("Press Enter to exit")
-    turtle = CONFIG.TURTLE
+    turtle = context.turtle
     rawname = os.path.splitext(fname)[0]
+    if isinstance(turtle, NumpyTurtle):
+        img = Image.fromarray(turtle.render()).convert("RGBA")
+        img.save(f"{rawname}.png", lossless=True)
+        turtle.clear()
+        return
     h, w = 256, 256
     ps = (
         turtle.getscreen()
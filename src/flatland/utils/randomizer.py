@@ -2,20 +2,90 @@ import json
 import random
 
 
-def GENERATE_NODEID():
+# node ids come from their own stream, so that creating nodes
+# does not change the random numbers drawn by the randomizers
+NODEID_RNG = random.Random()
+
+# the values randomizers start with, drawn when they are created,
+# so that creating one does not draw from the global random module
+INITIAL_RNG = random.Random()
+
+
+def GENERATE_NODEID(rng=None):
+    rng = NODEID_RNG if rng is None else rng
     return "{:08x}.fed{:05x}".format(
-        random.randrange(16 ** 8),
-        random.randrange(16 ** 5),
+        rng.getrandbits(32),
+        rng.getrandbits(20),
     )
 
 
-def GENERATE_FILEID():
+def GENERATE_FILEID(rng=None):
+    rng = random if rng is None else rng
     return "{:06x}-{:04x}".format(
-        random.randrange(16 ** 6),
-        random.randrange(16 ** 4),
+        rng.randrange(16 ** 6),
+        rng.randrange(16 ** 4),
     )
 
 
+def sample_rng(seed, index):
+    """The random stream for sample index of a job with the given seed,
+    the same on every machine, so that any sample can be made again."""
+    return random.Random(f"flatland:{seed}:{index}")
+
+
+def names_rng(seed, index):
+    """The stream the node names of sample index are drawn from, apart from
+    its values, so that naming more or fewer nodes does not change them."""
+    return random.Random(f"flatland-names:{seed}:{index}")
+
+
+class SlotStream(random.Random):
+    """A random stream that is told which randomizer draws from it, and the
+    slot of the program the value is for, so it can choose the value."""
+
+    def __new__(cls, *args, **kwargs):
+        # random.Random would otherwise seed itself with the arguments
+        return super().__new__(cls)
+
+    def draw(self, var, slot):
+        return var._draw(self)
+
+
+class PlanRecorder(SlotStream):
+    "Draw values as usual, and record the (slot, rule) of every draw."
+
+    def __init__(self, seed=0):
+        super().__init__(seed)
+        self.slots = []
+
+    def draw(self, var, slot):
+        self.slots.append((slot, var.to_dict()))
+        return var._draw(self)
+
+
+class PlannedStream(SlotStream):
+    """Answer the draws of a program with the given values, in the order of
+    the (slot, rule) pairs it was planned with. Node names are drawn from a
+    stream seeded with the values."""
+
+    def __init__(self, slots, values):
+        values = [float(v) for v in values]
+        super().__init__(repr(values))
+        self.slots = slots
+        self.values = values
+        self.index = 0
+
+    def draw(self, var, slot):
+        if self.index >= len(self.slots):
+            raise ValueError(f"{slot} was drawn, but is not in the plan")
+        planned, rule = self.slots[self.index]
+        if planned != slot or rule != var.to_dict():
+            raise ValueError(f"{slot} was drawn, but the plan expected {planned}")
+        value = self.values[self.index]
+        self.index += 1
+        return var._cast(value)
+
+
 class BaseRandomVar:
     def __init__(self, **kwargs) -> None:
         self._set_params(**kwargs)
@@ -29,17 +99,31 @@ class BaseRandomVar:
         self._reset_value()
 
     def _reset_value(self) -> None:
-        self.value = None
+        self.value = self._draw(INITIAL_RNG)
 
-    def _prettify(self) -> str:
-        # return a prettier form of self.value
-        return str(self.value)
+    def _draw(self, rng):
+        return None
 
-    def __call__(self, pretty=False) -> str:
-        self._reset_value()
+    def _cast(self, value):
+        # the value drawn, from a float in a parameter matrix
+        return value
+
+    def _prettify(self, value) -> str:
+        # return a prettier form of value
+        return str(value)
+
+    def __call__(self, pretty=False, rng=None, slot=None) -> str:
+        # draw from rng, or the global random module; randomizers are shared
+        # between threads, so the draw is returned from a local, and only
+        # mirrored to self.value
+        if isinstance(rng, SlotStream):
+            value = rng.draw(self, slot)
+        else:
+            value = self._draw(random if rng is None else rng)
+        self.value = value
         if pretty:
-            return self._prettify()
-        return self.value
+            return self._prettify(value)
+        return value
 
     def to_dict(self):
         return {"type": "<unk>"}
@@ -52,8 +136,11 @@ class RandomInt(BaseRandomVar):
     def __init__(self, min=0, max=5):
         super().__init__(min=min, max=max)
 
-    def _reset_value(self):
-        self.value = random.randrange(self.min, self.max)
+    def _draw(self, rng):
+        return rng.randrange(self.min, self.max)
+
+    def _cast(self, value):
+        return int(value)
 
     def to_dict(self):
         answer = dict(type="int", min=self.min, max=self.max)
@@ -64,8 +151,11 @@ class RandomFloat(BaseRandomVar):
     def __init__(self, min=0.0, max=1.0):
         super().__init__(min=min, max=max)
 
-    def _reset_value(self):
-        self.value = random.uniform(self.min, self.max)
+    def _draw(self, rng):
+        return rng.uniform(self.min, self.max)
+
+    def _cast(self, value):
+        return float(value)
 
     def to_dict(self):
         answer = dict(type="float", min=self.min, max=self.max)
@@ -76,8 +166,15 @@ class RandomChoice(BaseRandomVar):
     def __init__(self, *choices):
         super().__init__(choices=choices)
 
-    def _reset_value(self):
-        self.value = random.choice(self.choices)
+    def _draw(self, rng):
+        return rng.choice(self.choices)
+
+    def _cast(self, value):
+        # a parameter matrix holds the index of the choice
+        index = int(value)
+        if index != value or not 0 <= index < len(self.choices):
+            raise ValueError(f"{value} is not an index of {self.choices}")
+        return self.choices[index]
 
     def to_dict(self):
         answer = dict(type="choice", choices=self.choices)
@@ -88,11 +185,14 @@ class RandomBool(BaseRandomVar):
     def __init__(self, true_prob=0.9):
         super().__init__(true_prob=true_prob)
 
-    def _reset_value(self):
-        if random.random() < self.true_prob:
-            self.value = True
+    def _draw(self, rng):
+        if rng.random() < self.true_prob:
+            return True
         else:
-            self.value = False
+            return False
+
+    def _cast(self, value):
+        return bool(value)
 
     def to_dict(self):
         answer = dict(type="bool", true_prob=self.true_prob)
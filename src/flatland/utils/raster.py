@@ -0,0 +1,189 @@
+import math
+from array import array
+
+import numpy as np
+
+# the turtle draws on a 128x128 world that is exported as a 256x256 image
+WORLD_SIZE = 128
+IMAGE_SIZE = 256
+
+# width (in pixels) of a stroke after the Tk PostScript export,
+# measured against the images drawn by the Tk backend
+PEN_WIDTH = 1.44
+
+# upper bound on the number of candidate pixels rasterized at once
+CHUNK_PIXELS = 1 << 20
+
+
+def wrap(v, world=WORLD_SIZE):
+    while v < 0:
+        v = world + v
+    return v % world
+
+
+class StrokeLog:
+    """An append-only buffer of (x0, y0, x1, y1, penup) strokes,
+    stored flat in a double array to keep recording cheap."""
+
+    width = 5
+
+    def __init__(self, data=()):
+        self.buffer = array("d", data)
+
+    def append(self, x0, y0, x1, y1, penup=False):
+        self.buffer.extend((x0, y0, x1, y1, float(penup)))
+
+    def clear(self):
+        del self.buffer[:]
+
+    def __len__(self):
+        return len(self.buffer) // self.width
+
+    def to_array(self):
+        return np.array(self.buffer, dtype=np.float64).reshape(-1, self.width)
+
+    def segments(self):
+        "the (x0, y0, x1, y1) strokes that were drawn with the pen down"
+        strokes = self.to_array()
+        return strokes[strokes[:, 4] == 0, :4]
+
+    def save(self, fname):
+        np.save(fname, self.to_array())
+
+    @classmethod
+    def load(cls, fname):
+        return cls(np.load(fname).ravel())
+
+
+class NumpyTurtle:
+    """A headless turtle that only records its strokes while a program runs,
+    they are rasterized into a uint8 array in one batch afterwards."""
+
+    def __init__(self, size=IMAGE_SIZE, world=WORLD_SIZE):
+        self.size = size
+        self.world = world
+        self.clear()
+
+    def clear(self):
+        self.x, self.y = 0.0, 0.0
+        self.theta = 0.0
+        self.isdown = True
+        self.strokes = StrokeLog()
+        self.assembly = []
+        self.cur_id = 0
+
+    def position(self):
+        return (self.x, self.y)
+
+    def heading(self):
+        return self.theta % 360.0
+
+    def setheading(self, theta):
+        self.theta = float(theta) % 360.0
+
+    def left(self, angle):
+        self.theta = (self.theta + angle) % 360.0
+
+    def right(self, angle):
+        self.left(-angle)
+
+    def penup(self):
+        self.isdown = False
+
+    def pendown(self):
+        self.isdown = True
+
+    def goto(self, x, y=None):
+        if y is None:
+            x, y = x
+        if self.isdown:
+            self.strokes.append(self.x, self.y, x, y)
+        self.x, self.y = float(x), float(y)
+
+    def moveto(self, x, y=None):
+        self.penup()
+        self.goto(x, y)
+        self.pendown()
+
+    def moveby(self, x=0, y=0):
+        self.moveto(self.x + x, self.y + y)
+
+    def updatelog(self, type_, **kwargs):
+        obj = {"id": self.cur_id, "type": type_}
+        obj.update(kwargs)
+        self.cur_id += 1
+        self.assembly.append(obj)
+
+    def forward(self, distance):
+        # same semantics as MyTurtle.forward: the stroke is drawn
+        # to the unwrapped point, then the turtle jumps back into the world
+        rad = math.radians(self.theta)
+        x = self.x + distance * math.cos(rad)
+        y = self.y + distance * math.sin(rad)
+        self.strokes.append(self.x, self.y, x, y, not self.isdown)
+        self.x, self.y = wrap(x, self.world), wrap(y, self.world)
+
+    def render(self):
+        return rasterize(self.strokes.segments(), self.size, self.world)
+
+
+def rasterize(segments, size=IMAGE_SIZE, world=WORLD_SIZE):
+    """Draw (x0, y0, x1, y1) segments in world coordinates
+    as black anti-aliased strokes on a white (size, size) uint8 image."""
+    return rasterize_many([segments], size, world)[0]
+
+
+def rasterize_many(batch, size=IMAGE_SIZE, world=WORLD_SIZE, chunksize=CHUNK_PIXELS):
+    """Draw a batch of segment lists into a white (N, size, size) uint8 array.
+    The segments of all images are rasterized together, in chunks of at most
+    chunksize candidate pixels to bound the memory used."""
+    ink = np.zeros((len(batch), size, size), dtype=np.uint8)
+    segs = [np.asarray(x, dtype=np.float64).reshape(-1, 4) for x in batch]
+    imgs = np.repeat(np.arange(len(segs)), [len(x) for x in segs])
+    if len(imgs) == 0:
+        return 255 - ink
+    segs = np.concatenate(segs)
+
+    # world coordinates to pixel indices, y-axis points down in the image
+    # (pixel k covers [k, k+1), so its center is at k + 0.5)
+    scale = size / world
+    xs = segs[:, [0, 2]] * scale - 0.5
+    ys = size - segs[:, [1, 3]] * scale - 0.5
+    reach = PEN_WIDTH / 2 + 0.5
+
+    # every segment only touches the pixels in its (clipped) bounding box
+    left = np.clip(np.floor(xs.min(axis=1) - reach), 0, size).astype(np.int64)
+    right = np.clip(np.ceil(xs.max(axis=1) + reach), -1, size - 1).astype(np.int64)
+    top = np.clip(np.floor(ys.min(axis=1) - reach), 0, size).astype(np.int64)
+    bottom = np.clip(np.ceil(ys.max(axis=1) + reach), -1, size - 1).astype(np.int64)
+    widths = np.maximum(right - left + 1, 0)
+    counts = widths * np.maximum(bottom - top + 1, 0)
+
+    ends = np.cumsum(counts)
+    splits = np.searchsorted(ends, np.arange(chunksize, ends[-1], chunksize))
+    flat = ink.reshape(-1)
+    for chunk in np.split(np.arange(len(segs)), np.unique(splits)):
+        if len(chunk) == 0 or counts[chunk].sum() == 0:
+            continue
+        # enumerate the candidate pixels of the segments in the chunk
+        ccounts = counts[chunk]
+        sid = np.repeat(chunk, ccounts)
+        local = np.arange(len(sid)) - np.repeat(np.cumsum(ccounts) - ccounts, ccounts)
+        cols = left[sid] + local % widths[sid]
+        rows = top[sid] + local // widths[sid]
+
+        # distance from each pixel center to its segment
+        ax, ay = xs[sid, 0], ys[sid, 0]
+        dx, dy = xs[sid, 1] - ax, ys[sid, 1] - ay
+        norm = dx * dx + dy * dy
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = ((cols - ax) * dx + (rows - ay) * dy) / norm
+        t = np.clip(np.nan_to_num(t), 0, 1)
+        dist = np.hypot(cols - (ax + t * dx), rows - (ay + t * dy))
+
+        # rounding is monotonic, so taking the max of the quantized coverage
+        # is the same as quantizing the max coverage
+        cover = np.round(255 * np.clip(reach - dist, 0, 1)).astype(np.uint8)
+        index = (imgs[sid] * size + rows) * size + cols
+        np.maximum.at(flat, index, cover)
+    return 255 - ink
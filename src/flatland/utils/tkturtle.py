@@ -0,0 +1,96 @@
+# the Tk turtle and screen, imported only by the Tk backend,
+# so that the headless backend does not need a Tk install
+from turtle import RawTurtle as BaseTurtle
+from turtle import TurtleScreen as BaseScreen
+
+from flatland.utils.raster import StrokeLog
+
+
+class MyScreen(BaseScreen):
+    def __init__(self, canvas):
+        super().__init__(canvas)
+        self.tracer(1, 0)
+
+    def setworldcoordinates(self, llx, lly, urx, ury):
+        """Set up a user defined coordinate-system.
+        Arguments:
+        llx -- a number, x-coordinate of lower left corner of canvas
+        lly -- a number, y-coordinate of lower left corner of canvas
+        urx -- a number, x-coordinate of upper right corner of canvas
+        ury -- a number, y-coordinate of upper right corner of canvas
+        Set up user coodinat-system and switch to mode 'world' if necessary.
+        This performs a screen.reset. If mode 'world' is already active,
+        all drawings are redrawn according to the new coordinates.
+        But ATTENTION: in user-defined coordinatesystems angles may appear
+        distorted. (see Screen.mode())
+        Example (for a TurtleScreen instance named screen):
+        >>> screen.setworldcoordinates(-10,-0.5,50,1.5)
+        >>> for _ in range(36):
+        ...     left(10)
+        ...     forward(0.5)
+        """
+        if self.mode() != "world":
+            self.mode("world")
+        xspan = float(urx - llx)
+        yspan = float(ury - lly)
+        wx, wy = self._window_size()
+        self.screensize(int(wx) - 20, int(wy) - 20)
+        oldxscale, oldyscale = self.xscale, self.yscale
+        self.xscale = self.canvwidth / xspan
+        self.yscale = self.canvheight / yspan
+        srx1 = llx * self.xscale
+        sry1 = -ury * self.yscale
+        srx2 = self.canvwidth + srx1
+        sry2 = self.canvheight + sry1
+        self._setscrollregion(srx1, sry1, srx2, sry2)
+        self._rescale(self.xscale / oldxscale, self.yscale / oldyscale)
+        self.update()
+
+
+class MyTurtle(BaseTurtle):
+    def __init__(self, screen):
+        super().__init__(screen)
+        self.speed(0)
+        self.width(1)
+        self.hideturtle()
+        self.assembly = []
+        self.cur_id = 0
+        self.strokes = StrokeLog()
+
+    def moveto(self, x, y=None):
+        self.penup()
+        self.goto(x, y)
+        self.pendown()
+
+    def moveby(self, x=0, y=0):
+        sx, sy = self.position()
+        self.penup()
+        self.goto(sx + x, sy + y)
+        self.pendown()
+
+    def clear(self):
+        BaseTurtle.clear(self)
+        self.assembly = []
+        self.cur_id = 0
+        self.strokes.clear()
+
+    def updatelog(self, type_, **kwargs):
+        obj = {"id": self.cur_id, "type": type_}
+        obj.update(kwargs)
+        self.cur_id += 1
+        self.assembly.append(obj)
+
+    def forward(self, distance):
+        x0, y0 = self.position()
+        BaseTurtle.forward(self, distance)
+        x, y = self.position()
+        self.strokes.append(x0, y0, x, y, not self.isdown())
+        while x < 0:
+            x = 128 + x
+        while y < 0:
+            y = 128 + y
+        x = x % 128
+        y = y % 128
+        self.penup()
+        self.setposition(x, y)
+        self.pendown()